@@ -7,19 +7,42 @@ VERSÃO COM SISTEMA DE ROTAÇÃO DE TOKENS
 - Suporta até 4 tokens (BLUESOFT_TOKEN_1, 2, 3, 4)
 - Rotação automática quando atinge limite (25 consultas/dia por token)
 - Reset diário às 00:00
+- Uso dos tokens em ledger SQLite compartilhado entre workers e reinícios
 - Endpoint de monitoramento: GET /api/status/tokens
+- Cache persistente (SQLite) das respostas da Cosmos
+- Cache negativo dos GTINs não encontrados (404), com TTL próprio em dias
+- Consulta em lote: POST /api/produtos/lote
+- Conexões keep-alive reaproveitadas com a Cosmos (pool por processo)
+- Consultas simultâneas ao mesmo GTIN compartilham uma única chamada à Cosmos
+- Catálogo local de GTINs (arquivo binário mapeado em memória) consultado antes da Cosmos
+- Marca/fabricante inferidos pelo prefixo GS1 quando a Cosmos não conhece o GTIN ou a cota acabou
+- ETag/If-None-Match (304), Cache-Control e compressão gzip/br na consulta de produto
+- Respostas prontas (bytes já serializados e comprimidos) em memória para GTINs quentes
+- Métricas no formato Prometheus: GET /metrics
+- Boot rápido: Flask criado sob demanda (criar_app), caches aquecidos em
+  segundo plano e GET /ready para saber quando o aquecimento terminou
+
+Execução: gunicorn app:app (ou gunicorn 'app:criar_app()')
 """
 
-from flask import Flask, jsonify, request
-from flask_cors import CORS
-import urllib.request
+import http.client
 import json
+import socket
 import ssl
 import os
+import time
 from datetime import datetime
 
-app = Flask(__name__)
-CORS(app)  # Permitir requisições do frontend Ciclik
+from aquecimento import Aquecimento
+from cache_produtos import CacheProdutos
+from catalogo_gtin import CatalogoGTIN
+from cliente_cosmos import ClienteHTTPPool
+from coalescencia import ColetorConsultas
+from validacao_gtin import gtin_para_consulta, normalizar_gtin
+from ledger_tokens import LedgerTokens
+from prefixos_gs1 import IndicePrefixosGS1
+from respostas_http import CacheRespostasProntas, RespostasHTTP
+from metricas import TIPO_CONTEUDO, Registro
 
 # ==================== CONFIGURAÇÃO DE TOKENS ====================
 
@@ -50,63 +73,199 @@ if not TOKENS:
 # Limite diário por token (plano Basic = 25 consultas/dia)
 TOKEN_DAILY_LIMIT = 25
 
-# Controle de uso por token
-token_usage = {}  # {token: count}
-last_reset_day = datetime.now().day
+# Pasta dos arquivos locais (ledger de tokens e cache)
+# No Render, use um Persistent Disk para sobreviver a deploys
+PASTA_DADOS = os.environ.get('PASTA_DADOS', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dados'))
+
+# Controle de uso por token: compartilhado entre workers do gunicorn e reinícios
+TOKEN_LEDGER_PATH = os.environ.get('TOKEN_LEDGER_PATH', os.path.join(PASTA_DADOS, 'ledger_tokens.db'))
+ledger_tokens = LedgerTokens(TOKEN_LEDGER_PATH, TOKEN_DAILY_LIMIT)
 
 print(f"✅ Sistema de rotação iniciado com {len(TOKENS)} token(s)")
 
 # Contexto SSL (necessário para Cosmos)
 ssl_context = ssl._create_unverified_context()
 
+# ==================== CONFIGURAÇÃO DO CLIENTE COSMOS ====================
+
+# Pool de conexões keep-alive: evita um handshake TCP+TLS por consulta
+COSMOS_BASE_URL = os.environ.get('COSMOS_BASE_URL', 'https://api.cosmos.bluesoft.com.br')
+COSMOS_POOL_TAMANHO = int(os.environ.get('COSMOS_POOL_TAMANHO', '8'))
+COSMOS_TIMEOUT_CONEXAO = float(os.environ.get('COSMOS_TIMEOUT_CONEXAO', '5'))
+COSMOS_TIMEOUT_LEITURA = float(os.environ.get('COSMOS_TIMEOUT_LEITURA', '10'))
+
+cliente_cosmos = ClienteHTTPPool(
+    COSMOS_BASE_URL,
+    COSMOS_POOL_TAMANHO,
+    COSMOS_TIMEOUT_CONEXAO,
+    COSMOS_TIMEOUT_LEITURA,
+    ssl_context=ssl_context
+)
+
+# ==================== CONFIGURAÇÃO DO CACHE ====================
+
+# Cache persistente de produtos (evita gastar crédito com GTIN repetido)
+CACHE_DB_PATH = os.environ.get('CACHE_DB_PATH', os.path.join(PASTA_DADOS, 'cache_produtos.db'))
+CACHE_TTL_HORAS = float(os.environ.get('CACHE_TTL_HORAS', '720'))  # 30 dias
+CACHE_MAX_ITENS = int(os.environ.get('CACHE_MAX_ITENS', '50000'))
+
+# Cache negativo: GTINs que a Cosmos não conhece (marca própria, regionais...)
+# Um 404 também gasta crédito, então a resposta "não encontrado" é guardada por dias
+CACHE_NEGATIVO_TTL_DIAS = float(os.environ.get('CACHE_NEGATIVO_TTL_DIAS', '15'))
+CACHE_NEGATIVO_MAX_ITENS = int(os.environ.get('CACHE_NEGATIVO_MAX_ITENS', '50000'))
+
+cache_produtos = CacheProdutos(CACHE_DB_PATH, CACHE_TTL_HORAS * 3600, CACHE_MAX_ITENS)
+cache_nao_encontrados = CacheProdutos(
+    CACHE_DB_PATH,
+    CACHE_NEGATIVO_TTL_DIAS * 86400,
+    CACHE_NEGATIVO_MAX_ITENS,
+    tabela='nao_encontrados'
+)
+
+# Catálogo local compilado por catalogo_gtin.py (dumps de dados_api, catálogos de fornecedores)
+# Arquivo ausente = catálogo vazio; trocas do arquivo são percebidas a cada CATALOGO_GTIN_VERIFICACAO_S
+CATALOGO_GTIN_PATH = os.environ.get('CATALOGO_GTIN_PATH', os.path.join(PASTA_DADOS, 'catalogo_gtin.bin'))
+CATALOGO_GTIN_VERIFICACAO_S = float(os.environ.get('CATALOGO_GTIN_VERIFICACAO_S', '30'))
+
+catalogo_gtin = CatalogoGTIN(CATALOGO_GTIN_PATH, CATALOGO_GTIN_VERIFICACAO_S)
+
+# Prefixos de empresa GS1 aprendidos das respostas da Cosmos (mesmo arquivo do cache)
+# Completa marca/fabricante (marcados como inferidos) em 404 e com a cota esgotada
+PREFIXO_INFERENCIA = os.environ.get('PREFIXO_INFERENCIA', 'true').lower() == 'true'
+PREFIXO_CONFIANCA_MIN = float(os.environ.get('PREFIXO_CONFIANCA_MIN', '0.6'))
+PREFIXO_MIN_OBSERVACOES = int(os.environ.get('PREFIXO_MIN_OBSERVACOES', '3'))
+
+indice_prefixos = IndicePrefixosGS1(CACHE_DB_PATH, PREFIXO_CONFIANCA_MIN, PREFIXO_MIN_OBSERVACOES)
+
+# Consultas simultâneas ao mesmo GTIN viram uma só consulta à Cosmos
+consultas_em_andamento = ColetorConsultas()
+
+# ==================== CONFIGURAÇÃO DA CONSULTA EM LOTE ====================
+
+LOTE_MAX_ITENS = int(os.environ.get('LOTE_MAX_ITENS', '100'))
+LOTE_MAX_CONCORRENCIA = int(os.environ.get('LOTE_MAX_CONCORRENCIA', '4'))
+
+# ==================== CONFIGURAÇÃO DO CACHE HTTP ====================
+
+# Cache-Control de GET /api/produtos/{gtin}: o PWA (service worker) e proxies
+# reaproveitam a resposta e revalidam com If-None-Match (304 sem corpo)
+HTTP_MAX_AGE_ENCONTRADO = int(os.environ.get('HTTP_MAX_AGE_ENCONTRADO', '86400'))  # 1 dia
+HTTP_SWR_ENCONTRADO = int(os.environ.get('HTTP_SWR_ENCONTRADO', '604800'))  # 7 dias
+HTTP_MAX_AGE_NAO_ENCONTRADO = int(os.environ.get('HTTP_MAX_AGE_NAO_ENCONTRADO', '3600'))  # 1 hora
+HTTP_SWR_NAO_ENCONTRADO = int(os.environ.get('HTTP_SWR_NAO_ENCONTRADO', '86400'))  # 1 dia
+HTTP_COMPRESSAO_MIN_BYTES = int(os.environ.get('HTTP_COMPRESSAO_MIN_BYTES', '256'))
+
+respostas_produto = RespostasHTTP(
+    HTTP_MAX_AGE_ENCONTRADO,
+    HTTP_SWR_ENCONTRADO,
+    HTTP_MAX_AGE_NAO_ENCONTRADO,
+    HTTP_SWR_NAO_ENCONTRADO,
+    HTTP_COMPRESSAO_MIN_BYTES
+)
+
+# Respostas prontas em memória (por worker): um acerto não monta dicionário,
+# não serializa JSON nem comprime. TTL curto porque o cache em SQLite e o
+# índice de prefixos podem mudar por trás (0 itens desliga)
+RESPOSTAS_PRONTAS_MAX_ITENS = int(os.environ.get('RESPOSTAS_PRONTAS_MAX_ITENS', '5000'))
+RESPOSTAS_PRONTAS_TTL_S = float(os.environ.get('RESPOSTAS_PRONTAS_TTL_S', '600'))
+
+respostas_prontas = CacheRespostasProntas(RESPOSTAS_PRONTAS_MAX_ITENS, RESPOSTAS_PRONTAS_TTL_S)
+
+# ==================== CONFIGURAÇÃO DO AQUECIMENTO ====================
+
+# Produtos mais acessados do cache em disco que viram respostas prontas no boot
+AQUECIMENTO_RESPOSTAS_PRONTAS = int(os.environ.get(
+    'AQUECIMENTO_RESPOSTAS_PRONTAS', str(min(1000, RESPOSTAS_PRONTAS_MAX_ITENS))
+))
+
+aquecimento = Aquecimento()
+
+# ==================== MÉTRICAS (GET /metrics) ====================
+
+metricas = Registro()
+metrica_requisicoes = metricas.contador(
+    'ciclik_requisicoes_total', 'Requisições atendidas por rota, método e status', ('rota', 'metodo', 'status'))
+metrica_duracao_requisicao = metricas.histograma(
+    'ciclik_requisicao_duracao_segundos', 'Tempo de resposta por rota', ('rota',))
+metrica_em_andamento = metricas.medidor(
+    'ciclik_requisicoes_em_andamento', 'Requisições sendo atendidas agora')
+metrica_cosmos_duracao = metricas.histograma(
+    'ciclik_cosmos_duracao_segundos', 'Tempo de resposta da Cosmos por status HTTP (erro = falha de conexão)', ('status',))
+metrica_token_uso = metricas.medidor(
+    'ciclik_token_uso', 'Consultas usadas hoje por token (ledger)', ('token',))
+metrica_token_limite = metricas.medidor(
+    'ciclik_token_limite_diario', 'Limite diário de consultas por token')
+metrica_token_429 = metricas.contador(
+    'ciclik_token_429_total', 'Respostas 429 da Cosmos por token', ('token',))
+metrica_cache = metricas.contador(
+    'ciclik_cache_consultas_total', 'Consultas aos caches por resultado (acerto/falta)', ('cache', 'resultado'))
+metrica_cache_itens = metricas.medidor(
+    'ciclik_cache_itens', 'Itens guardados em cada cache', ('cache',))
+metrica_coalescencia = metricas.contador(
+    'ciclik_coalescencia_total', 'Consultas à Cosmos enviadas e requisições que aguardaram uma igual', ('tipo',))
+
+
+def id_token(token):
+    """Nome do token nas métricas (nunca o token em si)"""
+    return f"BLUESOFT_TOKEN_{TOKENS.index(token) + 1}"
+
+
+@metricas.coletor
+def coletar_estado():
+    """Copia para as métricas o que já é contado no ledger, caches e coalescência"""
+    uso = ledger_tokens.uso(TOKENS)
+    for token in TOKENS:
+        metrica_token_uso.definir(uso[token], token=id_token(token))
+    metrica_token_limite.definir(TOKEN_DAILY_LIMIT)
+    
+    metrica_cache_itens.definir(cache_produtos.estatisticas()['itens'], cache='produtos')
+    metrica_cache_itens.definir(cache_nao_encontrados.estatisticas()['itens'], cache='nao_encontrados')
+    metrica_cache_itens.definir(catalogo_gtin.estatisticas()['itens'], cache='catalogo')
+    metrica_cache_itens.definir(respostas_prontas.estatisticas()['itens'], cache='respostas_prontas')
+    
+    coalescencia = consultas_em_andamento.estatisticas()
+    metrica_coalescencia.definir(coalescencia['consultas_cosmos'], tipo='consultas_cosmos')
+    metrica_coalescencia.definir(coalescencia['consultas_coalescidas'], tipo='consultas_coalescidas')
 
-# ==================== FUNÇÕES DE CONTROLE DE TOKENS ====================
 
-def get_current_day():
-    """Retorna o dia atual (para detectar reset diário)"""
-    return datetime.now().day
+def registrar_requisicao(rota, metodo, status_http, duracao):
+    """Conta uma requisição atendida (Flask e asgi.py)"""
+    metrica_requisicoes.inc(rota=rota, metodo=metodo, status=status_http)
+    metrica_duracao_requisicao.observar(duracao, rota=rota)
 
 
-def reset_daily_counters():
-    """Reseta contadores quando muda o dia"""
-    global last_reset_day, token_usage
-    current_day = get_current_day()
-    
-    if current_day != last_reset_day:
-        print(f"🔄 Reset diário: {last_reset_day} -> {current_day}")
-        token_usage.clear()
-        last_reset_day = current_day
+def registrar_consulta_cosmos(inicio, status_code):
+    """Tempo de uma chamada à Cosmos; status None = falha de conexão"""
+    metrica_cosmos_duracao.observar(time.perf_counter() - inicio, status=status_code or 'erro')
 
 
+# ==================== FUNÇÕES DE CONTROLE DE TOKENS ====================
+
 def get_available_token():
     """
-    Retorna o próximo token disponível (que não atingiu o limite).
-    Reseta contadores automaticamente se mudou o dia.
+    Reserva uma consulta no próximo token disponível (que não atingiu o limite).
+    O uso é contado já na reserva, no ledger compartilhado, para que
+    consultas simultâneas (lote, modo asyncio, vários workers) não
+    ultrapassem o limite diário; se a Cosmos não cobrar a consulta,
+    devolva a reserva com release_token_usage.
+    O ledger conta por data, então a virada do dia zera o uso.
     """
-    reset_daily_counters()
-    
-    for token in TOKENS:
-        usado = token_usage.get(token, 0)
-        if usado < TOKEN_DAILY_LIMIT:
-            return token
+    token, usado = ledger_tokens.reservar(TOKENS)
+    if not token:
+        return None  # Todos os tokens esgotados
     
-    return None  # Todos os tokens esgotados
+    print(f"📊 Token ...{token[-6:]} usado {usado}/{TOKEN_DAILY_LIMIT}x hoje")
+    return token
 
 
-def increment_token_usage(token):
-    """Incrementa o contador de uso de um token"""
-    if token in token_usage:
-        token_usage[token] += 1
-    else:
-        token_usage[token] = 1
-    
-    usado = token_usage[token]
-    print(f"📊 Token ...{token[-6:]} usado {usado}/{TOKEN_DAILY_LIMIT}x hoje")
+def release_token_usage(token):
+    """Devolve uma consulta reservada que a Cosmos não cobrou (erro de rede, 5xx...)"""
+    ledger_tokens.liberar(token)
 
 
-def get_token_status():
-    """Retorna status de todos os tokens"""
-    reset_daily_counters()
+def status_tokens_ledger():
+    """Status de todos os tokens (só o ledger: barato para /health e respostas 429)"""
+    token_usage = ledger_tokens.uso(TOKENS)
     
     status = []
     for i, token in enumerate(TOKENS, 1):
@@ -132,56 +291,85 @@ def get_token_status():
             "total_disponivel": total_disponivel,
             "limite_total": len(TOKENS) * TOKEN_DAILY_LIMIT
         },
-        "ultimo_reset": f"Dia {last_reset_day}",
+        "ultimo_reset": f"Dia {datetime.now().day}",
         "proximo_reset": "00:00 (meia-noite)"
     }
 
 
+def get_token_status():
+    """
+    Status dos tokens com o resumo dos caches, do catálogo e do índice de
+    prefixos (contagens em SQLite: só para /api/status/tokens)
+    """
+    return {
+        **status_tokens_ledger(),
+        "cache": cache_produtos.estatisticas(),
+        "cache_nao_encontrados": cache_nao_encontrados.estatisticas(),
+        "catalogo": catalogo_gtin.estatisticas(),
+        "prefixos_gs1": indice_prefixos.estatisticas(),
+        "respostas_prontas": respostas_prontas.estatisticas(),
+        "coalescencia": consultas_em_andamento.estatisticas()
+    }
+
+
 # ==================== FUNÇÕES DE VALIDAÇÃO E CONSULTA ====================
 
 def validar_gtin(gtin):
-    """Valida se o GTIN tem 13 dígitos numéricos"""
-    if not gtin:
-        return False, "GTIN não fornecido"
-    if not gtin.isdigit():
-        return False, "GTIN deve conter apenas números"
-    if len(gtin) != 13:
-        return False, f"GTIN deve ter 13 dígitos (recebido: {len(gtin)})"
-    return True, "OK"
+    """
+    Valida o GTIN (8, 12, 13 ou 14 dígitos + dígito verificador GS1).
+    Retorna (forma canônica de 14 dígitos, None) ou (None, mensagem de erro).
+    """
+    return normalizar_gtin(gtin)
 
 
-def consultar_cosmos(gtin, token):
-    """Consulta a API Cosmos Bluesoft usando um token específico"""
-    headers = {
+def headers_cosmos(token):
+    """Headers das requisições à Cosmos para um token específico"""
+    return {
         'X-Cosmos-Token': token,
         'Content-Type': 'application/json',
         'User-Agent': 'Ciclik-API-v1.0'
     }
-    
+
+
+def interpretar_resposta_cosmos(status_code, corpo):
+    """Converte status/corpo da Cosmos em (data, erro, status_code)"""
+    if status_code == 200:
+        return json.loads(corpo), None, 200
+    elif status_code == 404:
+        return None, "Produto não encontrado na base Cosmos", 404
+    elif status_code == 429:
+        return None, "Limite de requisições atingido", 429
+    return None, f"Erro HTTP {status_code}: {http.client.responses.get(status_code, '')}", status_code
+
+
+def consultar_cosmos(gtin, token):
+    """Consulta a API Cosmos Bluesoft usando um token específico"""
+    inicio = time.perf_counter()
     try:
-        req = urllib.request.Request(
-            f'https://api.cosmos.bluesoft.com.br/gtins/{gtin}.json',
-            None,
-            headers
-        )
-        response = urllib.request.urlopen(req, context=ssl_context, timeout=10)
-        data = json.loads(response.read())
-        return data, None, response.getcode()
-    
-    except urllib.error.HTTPError as e:
-        if e.code == 404:
-            return None, "Produto não encontrado na base Cosmos", 404
-        elif e.code == 429:
-            return None, "Limite de requisições atingido", 429
-        return None, f"Erro HTTP {e.code}: {e.reason}", e.code
+        status_code, _, corpo = cliente_cosmos.get(f'/gtins/{gtin}.json', headers_cosmos(token))
+        registrar_consulta_cosmos(inicio, status_code)
+        return interpretar_resposta_cosmos(status_code, corpo)
     
-    except urllib.error.URLError as e:
-        return None, f"Erro de conexão: {str(e.reason)}", None
+    except (socket.timeout, OSError, http.client.HTTPException) as e:
+        registrar_consulta_cosmos(inicio, None)
+        return None, f"Erro de conexão: {str(e)}", None
     
     except Exception as e:
         return None, f"Erro inesperado: {str(e)}", None
 
 
+def marcar_token_esgotado(token):
+    """Marca um token como esgotado após a Cosmos responder 429"""
+    print(f"⚠️  Token ...{token[-6:]} atingiu limite (429)")
+    metrica_token_429.inc(token=id_token(token))
+    ledger_tokens.esgotar(token)
+
+
+def mensagem_tokens_esgotados():
+    """Mensagem de erro quando nenhum token tem consultas disponíveis"""
+    return f"Todos os {len(TOKENS)} tokens esgotaram o limite diário de {TOKEN_DAILY_LIMIT} consultas. Próximo reset: 00:00 (meia-noite)"
+
+
 def consultar_bluesoft_com_rotacao(gtin):
     """
     Consulta Bluesoft com rotação automática de tokens.
@@ -194,21 +382,20 @@ def consultar_bluesoft_com_rotacao(gtin):
         token = get_available_token()
         
         if not token:
-            return None, f"Todos os {len(TOKENS)} tokens esgotaram o limite diário de {TOKEN_DAILY_LIMIT} consultas. Próximo reset: 00:00 (meia-noite)", 429
+            return None, mensagem_tokens_esgotados(), 429
         
         # Tentar consulta com este token
         data, erro, status_code = consultar_cosmos(gtin, token)
         
         # Se retornou 429 (rate limit), marcar token como esgotado e tentar próximo
         if status_code == 429:
-            print(f"⚠️  Token ...{token[-6:]} atingiu limite (429)")
-            token_usage[token] = TOKEN_DAILY_LIMIT  # Marcar como esgotado
+            marcar_token_esgotado(token)
             tentativas += 1
             continue
         
-        # Se chegou aqui, consulta foi bem sucedida (ou erro diferente de 429)
-        if status_code == 200 or status_code == 404:
-            increment_token_usage(token)
+        # Só 200 e 404 são cobrados pela Cosmos; outros erros devolvem a reserva
+        if status_code != 200 and status_code != 404:
+            release_token_usage(token)
         
         return data, erro, status_code
     
@@ -288,144 +475,525 @@ def formatar_resposta(data):
     }
 
 
-# ==================== ROTAS DA API ====================
+def completar_por_prefixo(resposta, canonico):
+    """
+    Acrescenta marca/fabricante inferidos pelo prefixo GS1 a uma resposta
+    sem produto (404 ou cota esgotada), com "inferido": true e os detalhes
+    da inferência. Sem evidência suficiente, a resposta fica como está.
+    """
+    if not PREFIXO_INFERENCIA:
+        return resposta
+    
+    inferencia = indice_prefixos.inferir(canonico)
+    metrica_cache.inc(cache='prefixos_gs1', resultado='acerto' if inferencia else 'falta')
+    if inferencia:
+        resposta["marca"] = inferencia.pop("marca")
+        resposta["fabricante"] = inferencia.pop("fabricante")
+        resposta["inferido"] = True
+        resposta["inferencia"] = inferencia
+    return resposta
+
+
+def resolver_local(gtin):
+    """
+    Resolve um GTIN sem chamar a Cosmos: validação, caches e catálogo local.
+    Retorna (resultado, gtin canônico): resultado é (corpo da resposta,
+    status HTTP), ou None se for preciso consultar a Cosmos.
+    Caches e coalescência usam sempre a forma canônica (14 dígitos).
+    """
+    # Validar GTIN (inclui dígito verificador: código errado não gasta crédito)
+    canonico, mensagem = validar_gtin(gtin)
+    if not canonico:
+        return ({
+            "erro": "GTIN inválido",
+            "mensagem": mensagem,
+            "ean_gtin": gtin
+        }, 400), None
+    
+    # Consultar cache antes de gastar crédito na Cosmos
+    resposta_cache = cache_produtos.obter(canonico)
+    metrica_cache.inc(cache='produtos', resultado='acerto' if resposta_cache else 'falta')
+    if resposta_cache:
+        resposta_cache["origem"] = "cache"
+        return (resposta_cache, 200), canonico
+    
+    # Catálogo local (busca binária no mmap): antes do cache negativo, porque
+    # um GTIN que a Cosmos não conhece pode estar no catálogo de um fornecedor
+    resposta_catalogo = catalogo_gtin.obter(canonico)
+    metrica_cache.inc(cache='catalogo', resultado='acerto' if resposta_catalogo else 'falta')
+    if resposta_catalogo:
+        resposta_catalogo["origem"] = "catalogo"
+        return (resposta_catalogo, 200), canonico
+    
+    # GTIN que a Cosmos já respondeu 404 recentemente: responder sem gastar crédito
+    resposta_negativa = cache_nao_encontrados.obter(canonico)
+    metrica_cache.inc(cache='nao_encontrados', resultado='acerto' if resposta_negativa else 'falta')
+    if resposta_negativa:
+        resposta_negativa["origem"] = "cache"
+        return (completar_por_prefixo(resposta_negativa, canonico), 200), canonico
+    
+    return None, canonico
+
+
+def reconferir_cache(canonico):
+    """
+    Confere os caches de novo já dentro da consulta coalescida: um líder
+    anterior pode ter gravado o resultado entre a falta em resolver_local
+    e o início desta consulta. Retorna (corpo, status HTTP) ou None.
+    """
+    resposta_cache = cache_produtos.obter(canonico)
+    if resposta_cache:
+        resposta_cache["origem"] = "cache"
+        return resposta_cache, 200
+    
+    resposta_negativa = cache_nao_encontrados.obter(canonico)
+    if resposta_negativa:
+        resposta_negativa["origem"] = "cache"
+        return completar_por_prefixo(resposta_negativa, canonico), 200
+    
+    return None
+
+
+def montar_resposta(canonico, data, erro, status_code):
+    """
+    Converte o resultado da Cosmos (data, erro, status_code) na resposta
+    da API e alimenta os caches. Retorna (corpo da resposta, status HTTP).
+    """
+    gtin = gtin_para_consulta(canonico)
+    
+    # Tratar erro de rate limit (todos os tokens esgotados)
+    if status_code == 429:
+        return completar_por_prefixo({
+            "erro": "Limite de consultas atingido",
+            "mensagem": erro,
+            "ean_gtin": gtin,
+            "status_tokens": status_tokens_ledger()
+        }, canonico), 429
+    
+    # Tratar produto não encontrado (404)
+    if status_code == 404 or (erro and "não encontrado" in erro.lower()):
+        resposta_negativa = {
+            "encontrado": False,
+            "ean_gtin": gtin,
+            "mensagem": erro or "Produto não encontrado na base Cosmos"
+        }
+        cache_nao_encontrados.salvar(canonico, resposta_negativa)
+        resposta_negativa["origem"] = "cosmos"
+        return completar_por_prefixo(resposta_negativa, canonico), 200
+    
+    # Tratar outros erros
+    if erro:
+        return {
+            "erro": "Erro na consulta",
+            "mensagem": erro,
+            "ean_gtin": gtin
+        }, 500
+    
+    # Formatar, guardar no cache e retornar resposta de sucesso
+    resposta = formatar_resposta(data)
+    cache_produtos.salvar(canonico, resposta)
+    if PREFIXO_INFERENCIA:
+        indice_prefixos.aprender(canonico, resposta)
+    resposta["origem"] = "cosmos"
+    return resposta, 200
+
 
-@app.route('/')
-def home():
-    """Endpoint raiz - informações da API"""
-    return jsonify({
+def resolver_produto(gtin):
+    """
+    Resolve um GTIN pelo cache ou pela Cosmos (com rotação de tokens).
+    Retorna (corpo da resposta, status HTTP), usado pela consulta
+    individual e pela consulta em lote.
+    """
+    resultado_local, canonico = resolver_local(gtin)
+    if resultado_local:
+        return resultado_local
+    
+    # Consultar Bluesoft com rotação de tokens; requisições simultâneas
+    # para o mesmo GTIN aguardam esta mesma consulta
+    def consultar():
+        resultado_cache = reconferir_cache(canonico)
+        if resultado_cache:
+            return resultado_cache
+        data, erro, status_code = consultar_bluesoft_com_rotacao(gtin_para_consulta(canonico))
+        return montar_resposta(canonico, data, erro, status_code)
+    
+    return consultas_em_andamento.executar(canonico, consultar)
+
+
+def obter_resposta_pronta(gtin):
+    """
+    Resposta pronta (bytes) do GTIN, se estiver em memória.
+    Retorna (RespostaPronta ou None, gtin canônico ou None se inválido).
+    """
+    canonico, _ = validar_gtin(gtin)
+    if not canonico:
+        return None, None
+    
+    pronta = respostas_prontas.obter(canonico)
+    metrica_cache.inc(cache='respostas_prontas', resultado='acerto' if pronta else 'falta')
+    return pronta, canonico
+
+
+def preparar_resposta_pronta(canonico, resposta, status_http):
+    """
+    Serializa a resposta (corpo, status) para envio e, se for um resultado
+    definitivo (200), guarda os bytes com as variantes comprimidas.
+    """
+    pronta = respostas_produto.preparar(resposta, status_http)
+    if not canonico or status_http != 200:
+        return pronta
+    
+    # A cópia guardada é a que um acerto local devolveria: "origem": "cache"
+    if resposta.get("origem") == "cosmos":
+        respostas_prontas.salvar(canonico, respostas_produto.preparar({**resposta, "origem": "cache"}, 200).precomprimir())
+    else:
+        respostas_prontas.salvar(canonico, pronta.precomprimir())
+    return pronta
+
+
+def resolver_produto_pronto(gtin):
+    """Como resolver_produto, mas devolve a RespostaPronta (bytes) da consulta"""
+    pronta, canonico = obter_resposta_pronta(gtin)
+    if pronta:
+        return pronta
+    
+    resposta, status_http = resolver_produto(gtin)
+    return preparar_resposta_pronta(canonico, resposta, status_http)
+
+
+# ==================== AQUECIMENTO (BOOT) ====================
+
+@aquecimento.etapa('sqlite')
+def abrir_bancos():
+    """Abre as conexões do ledger e dos caches (cria as tabelas se preciso)"""
+    ledger_tokens.uso(TOKENS)
+    return {
+        "cache": cache_produtos.estatisticas()["itens"],
+        "cache_nao_encontrados": cache_nao_encontrados.estatisticas()["itens"]
+    }
+
+
+@aquecimento.etapa('prefixos_gs1')
+def povoar_prefixos():
+    """Povoa o índice de prefixos com o cache na primeira execução"""
+    if not PREFIXO_INFERENCIA:
+        return 0
+    aprendidos = indice_prefixos.povoar_se_vazio(cache_produtos.itens())
+    if aprendidos:
+        print(f"🏷️  Índice de prefixos GS1 povoado com {aprendidos} produto(s) do cache")
+    return aprendidos
+
+
+@aquecimento.etapa('catalogo')
+def aquecer_catalogo():
+    """Mapeia o catálogo local e traz as chaves para a memória"""
+    return catalogo_gtin.aquecer()
+
+
+@aquecimento.etapa('respostas_prontas')
+def carregar_respostas_prontas():
+    """Serializa os produtos mais acessados do cache em disco (primeiros scans já quentes)"""
+    quantidade = 0
+    for canonico, resposta in cache_produtos.mais_acessados(AQUECIMENTO_RESPOSTAS_PRONTAS):
+        preparar_resposta_pronta(canonico, {**resposta, "origem": "cache"}, 200)
+        quantidade += 1
+    return quantidade
+
+
+def iniciar_aquecimento():
+    """Inicia o aquecimento neste processo (idempotente; refeito após fork)"""
+    aquecimento.iniciar()
+
+
+# ==================== RESPOSTAS (COMPARTILHADAS COM asgi.py) ====================
+
+def info_api():
+    """Corpo do endpoint raiz"""
+    return {
         "nome": "Ciclik API - Consulta de Produtos",
         "versao": "2.0.0 (com rotação de tokens)",
         "status": "online",
         "tokens_configurados": len(TOKENS),
         "endpoints": {
             "consulta_produto": "GET /api/produtos/{gtin}",
+            "consulta_lote": "POST /api/produtos/lote",
             "status_tokens": "GET /api/status/tokens",
-            "health_check": "GET /health"
+            "metricas": "GET /metrics",
+            "health_check": "GET /health",
+            "prontidao": "GET /ready"
         },
         "documentacao": "https://github.com/natanjs01/Ciclik_validacoes"
-    })
+    }
 
 
-@app.route('/health')
-def health():
-    """Health check para monitoramento"""
-    status = get_token_status()
-    return jsonify({
+def info_health():
+    """Corpo do health check (sem varrer os caches: o Render chama a toda hora)"""
+    status = status_tokens_ledger()
+    return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "tokens_disponiveis": status["resumo"]["total_disponivel"],
-        "limite_total": status["resumo"]["limite_total"]
-    }), 200
+        "limite_total": status["resumo"]["limite_total"],
+        "boot": aquecimento.tempos()
+    }
 
 
-@app.route('/api/status/tokens', methods=['GET'])
-def status_tokens():
-    """
-    Endpoint de monitoramento de tokens.
-    Retorna uso de cada token e total disponível.
-    
-    Headers:
-    - Authorization: Bearer {token} (opcional - recomendado em produção)
-    """
-    # Validar autenticação (opcional)
-    auth_header = request.headers.get('Authorization')
-    if auth_header and auth_header.startswith('Bearer '):
-        token = auth_header.replace('Bearer ', '').strip()
-        if token != API_TOKEN:
-            return jsonify({
-                "erro": "Token inválido",
-                "mensagem": "Token de autorização não autorizado"
-            }), 401
-    
-    status = get_token_status()
-    return jsonify(status), 200
-
-
-@app.route('/api/produtos/<gtin>', methods=['GET'])
-def consultar_produto(gtin):
+def info_ready():
+    """Corpo e status do /ready: 200 com os caches aquecidos, 503 enquanto aquece"""
+    return aquecimento.estado(), 200 if aquecimento.pronto else 503
+
+
+def checar_autorizacao(auth_header, obrigatoria=True):
     """
-    Consulta produto por GTIN com rotação automática de tokens.
-    
-    Parâmetros:
-    - gtin: Código GTIN de 13 dígitos
-    
-    Headers:
-    - Authorization: Bearer {token}
+    Valida o header Authorization: Bearer {token}.
+    Retorna None se autorizado, ou (corpo, 401) com o erro.
+    Com obrigatoria=False, a ausência do header é aceita.
     """
-    # Validar autenticação
-    auth_header = request.headers.get('Authorization')
     if not auth_header or not auth_header.startswith('Bearer '):
-        return jsonify({
+        if not obrigatoria:
+            return None
+        return {
             "erro": "Token de autorização não fornecido",
             "mensagem": "Use: Authorization: Bearer {token}"
-        }), 401
+        }, 401
     
     token = auth_header.replace('Bearer ', '').strip()
     if token != API_TOKEN:
-        return jsonify({
+        return {
             "erro": "Token inválido",
             "mensagem": "Token de autorização não autorizado"
-        }), 401
+        }, 401
     
-    # Validar GTIN
-    valido, mensagem = validar_gtin(gtin)
-    if not valido:
-        return jsonify({
-            "erro": "GTIN inválido",
-            "mensagem": mensagem,
-            "ean_gtin": gtin
-        }), 400
+    return None
+
+
+def preparar_lote(corpo):
+    """
+    Valida o body da consulta em lote e remove GTINs duplicados (mesmo GTIN canônico).
+    Retorna (gtins únicos, total recebido, None) ou (None, None, (corpo, 400)).
+    """
+    gtins = corpo.get('gtins') if isinstance(corpo, dict) else None
+    if not isinstance(gtins, list) or not gtins:
+        return None, None, ({
+            "erro": "Requisição inválida",
+            "mensagem": 'Envie um JSON no formato {"gtins": ["7891910000197", ...]}'
+        }, 400)
     
-    # Consultar Bluesoft com rotação de tokens
-    data, erro, status_code = consultar_bluesoft_com_rotacao(gtin)
+    # Remover duplicados pelo GTIN canônico ("7891910000197" e "07891910000197"
+    # custam uma consulta só), mantendo a ordem e a grafia da primeira ocorrência
+    unicos = {}
+    for gtin in gtins:
+        texto = str(gtin).strip()
+        unicos.setdefault(normalizar_gtin(texto)[0] or texto, texto)
+    gtins_unicos = list(unicos.values())
     
-    # Tratar erro de rate limit (todos os tokens esgotados)
-    if status_code == 429:
-        return jsonify({
-            "erro": "Limite de consultas atingido",
-            "mensagem": erro,
-            "ean_gtin": gtin,
-            "status_tokens": get_token_status()
-        }), 429
+    if len(gtins_unicos) > LOTE_MAX_ITENS:
+        return None, None, ({
+            "erro": "Lote muito grande",
+            "mensagem": f"Máximo de {LOTE_MAX_ITENS} GTINs por requisição (recebido: {len(gtins_unicos)})"
+        }, 400)
     
-    # Tratar produto não encontrado (404)
-    if status_code == 404 or (erro and "não encontrado" in erro.lower()):
+    return gtins_unicos, len(gtins), None
+
+
+def montar_resultado_lote(gtins_unicos, total_recebido, respostas):
+    """Junta as respostas (corpo, status) de cada GTIN no corpo do lote"""
+    resultados = [
+        {"ean_gtin": gtin, "status": status_http, "resposta": resposta}
+        for gtin, (resposta, status_http) in zip(gtins_unicos, respostas)
+    ]
+    
+    return {
+        "total": len(resultados),
+        "duplicados_ignorados": total_recebido - len(gtins_unicos),
+        "resultados": resultados
+    }
+
+
+# ==================== ROTAS DA API ====================
+
+def criar_app():
+    """
+    Cria a aplicação Flask com todas as rotas e inicia o aquecimento.
+    O Flask só é importado aqui: o asgi.py usa este módulo sem pagar por ele.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from flask import Flask, Response, g, jsonify, request
+    from flask_cors import CORS
+    
+    app = Flask(__name__)
+    CORS(app)  # Permitir requisições do frontend Ciclik
+    
+    @app.before_request
+    def iniciar_medicao():
+        g.inicio_requisicao = time.perf_counter()
+        metrica_em_andamento.inc()
+        # Com gunicorn --preload o app é criado antes do fork: aquece no worker
+        iniciar_aquecimento()
+    
+    @app.after_request
+    def registrar_medicao(resposta):
+        # Rota com o parâmetro (/api/produtos/<gtin>), não o GTIN, para não explodir rótulos
+        rota = request.url_rule.rule if request.url_rule else 'desconhecida'
+        registrar_requisicao(rota, request.method, resposta.status_code, time.perf_counter() - g.inicio_requisicao)
+        return resposta
+    
+    @app.teardown_request
+    def encerrar_medicao(erro=None):
+        metrica_em_andamento.dec()
+    
+    @app.route('/')
+    def home():
+        """Endpoint raiz - informações da API"""
+        return jsonify(info_api())
+    
+    @app.route('/health')
+    def health():
+        """Health check para monitoramento"""
+        return jsonify(info_health()), 200
+    
+    @app.route('/ready')
+    def ready():
+        """Prontidão: 200 quando os caches já foram carregados, 503 enquanto aquece"""
+        corpo, status_http = info_ready()
+        return jsonify(corpo), status_http
+    
+    def validar_autorizacao(obrigatoria=True):
+        """
+        Valida o header Authorization da requisição atual.
+        Retorna None se autorizado, ou a resposta de erro (401) pronta.
+        """
+        erro = checar_autorizacao(request.headers.get('Authorization'), obrigatoria)
+        if erro:
+            corpo, status_http = erro
+            return jsonify(corpo), status_http
+        return None
+    
+    def responder_produto(pronta):
+        """
+        Resposta de produto (consulta ou erro) com ETag/304, Cache-Control e
+        compressão, igual ao que o servidor ASGI envia.
+        """
+        status_http, conteudo, headers = respostas_produto.enviar(
+            pronta,
+            request.headers.get('Accept-Encoding'),
+            request.headers.get('If-None-Match')
+        )
+        return Response(conteudo, status=status_http, headers=headers)
+    
+    @app.route('/api/status/tokens', methods=['GET'])
+    def status_tokens():
+        """
+        Endpoint de monitoramento de tokens.
+        Retorna uso de cada token e total disponível.
+    
+        Headers:
+        - Authorization: Bearer {token} (opcional - recomendado em produção)
+        """
+        # Validar autenticação (opcional)
+        erro_autorizacao = validar_autorizacao(obrigatoria=False)
+        if erro_autorizacao:
+            return erro_autorizacao
+    
+        status = get_token_status()
+        return jsonify(status), 200
+    
+    @app.route('/metrics', methods=['GET'])
+    def exportar_metricas():
+        """
+        Métricas no formato texto do Prometheus.
+    
+        Headers:
+        - Authorization: Bearer {token} (opcional, como em /api/status/tokens)
+        """
+        erro_autorizacao = validar_autorizacao(obrigatoria=False)
+        if erro_autorizacao:
+            return erro_autorizacao
+    
+        return Response(metricas.exportar(), content_type=TIPO_CONTEUDO)
+    
+    @app.route('/api/produtos/<gtin>', methods=['GET'])
+    def consultar_produto(gtin):
+        """
+        Consulta produto por GTIN com rotação automática de tokens.
+    
+        Parâmetros:
+        - gtin: Código GTIN-8, GTIN-12, GTIN-13 ou GTIN-14 (com dígito verificador válido)
+    
+        Headers:
+        - Authorization: Bearer {token}
+        - If-None-Match: ETag de uma resposta anterior (opcional → 304 se não mudou)
+        - Accept-Encoding: br, gzip (opcional → corpo comprimido)
+        """
+        erro = checar_autorizacao(request.headers.get('Authorization'))
+        if erro:
+            corpo, status_http = erro
+            return responder_produto(respostas_produto.preparar(corpo, status_http))
+    
+        return responder_produto(resolver_produto_pronto(gtin))
+    
+    @app.route('/api/produtos/lote', methods=['POST'])
+    def consultar_produtos_lote():
+        """
+        Consulta vários GTINs em uma única requisição.
+        GTINs repetidos são consultados uma única vez; cada um é resolvido pelo
+        cache ou pela Cosmos (com rotação de tokens), em paralelo limitado
+        por LOTE_MAX_CONCORRENCIA.
+    
+        Body (JSON):
+        - gtins: lista de códigos GTIN (máximo LOTE_MAX_ITENS)
+    
+        Headers:
+        - Authorization: Bearer {token}
+    
+        Retorna um resultado por GTIN, cada um com seu próprio status HTTP
+        (o mesmo que GET /api/produtos/{gtin} retornaria).
+        """
+        erro_autorizacao = validar_autorizacao()
+        if erro_autorizacao:
+            return erro_autorizacao
+    
+        gtins_unicos, total_recebido, erro = preparar_lote(request.get_json(silent=True))
+        if erro:
+            corpo, status_http = erro
+            return jsonify(corpo), status_http
+    
+        with ThreadPoolExecutor(max_workers=LOTE_MAX_CONCORRENCIA) as executor:
+            respostas = list(executor.map(resolver_produto, gtins_unicos))
+    
+        return jsonify(montar_resultado_lote(gtins_unicos, total_recebido, respostas)), 200
+    
+    @app.errorhandler(404)
+    def not_found(error):
         return jsonify({
-            "encontrado": False,
-            "ean_gtin": gtin,
-            "mensagem": erro or "Produto não encontrado na base Cosmos"
-        }), 200
+            "erro": "Endpoint não encontrado",
+            "mensagem": "Verifique a URL e tente novamente"
+        }), 404
     
-    # Tratar outros erros
-    if erro:
+    @app.errorhandler(500)
+    def internal_error(error):
         return jsonify({
-            "erro": "Erro na consulta",
-            "mensagem": erro,
-            "ean_gtin": gtin
+            "erro": "Erro interno do servidor",
+            "mensagem": "Entre em contato com o suporte"
         }), 500
     
-    # Formatar e retornar resposta de sucesso
-    resposta = formatar_resposta(data)
-    return jsonify(resposta), 200
+    iniciar_aquecimento()
+    return app
 
 
-@app.errorhandler(404)
-def not_found(error):
-    return jsonify({
-        "erro": "Endpoint não encontrado",
-        "mensagem": "Verifique a URL e tente novamente"
-    }), 404
+_app_flask = None
 
 
-@app.errorhandler(500)
-def internal_error(error):
-    return jsonify({
-        "erro": "Erro interno do servidor",
-        "mensagem": "Entre em contato com o suporte"
-    }), 500
+def __getattr__(nome):
+    """gunicorn app:app — a aplicação Flask é criada no primeiro acesso"""
+    global _app_flask
+    if nome == 'app':
+        if _app_flask is None:
+            _app_flask = criar_app()
+        return _app_flask
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
 
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=False)
+    criar_app().run(host='0.0.0.0', port=port, debug=False)
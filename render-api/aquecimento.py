@@ -0,0 +1,123 @@
+"""
+Aquecimento da API no boot (cold start do Render)
+No plano free o Render adormece o serviço e a primeira requisição espera a
+instância subir. O processo passa a responder assim que o módulo carrega;
+o trabalho pesado (abrir SQLite, povoar o índice de prefixos, trazer para
+a memória os produtos mais acessados do cache em disco) roda em segundo
+plano, em etapas cronometradas.
+
+- GET /health: processo no ar (sempre 200) + tempos de boot
+- GET /ready: 200 só depois do aquecimento; 503 enquanto aquece
+- Seguro para o fork do gunicorn: cada processo aquece a própria memória
+"""
+
+import os
+import threading
+import time
+
+# Marca o carregamento deste módulo (importado pelo app.py antes de montar os caches)
+INICIO_MODULO = time.monotonic()
+
+
+def segundos_desde_inicio_processo():
+    """
+    Idade do processo, incluindo a subida do interpretador. No Linux vem do
+    /proc; em outros sistemas, conta a partir do carregamento deste módulo.
+    """
+    try:
+        with open('/proc/self/stat') as arquivo:
+            # O nome do processo (2º campo) pode ter espaços: campos após o ')'
+            campos = arquivo.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as arquivo:
+            uptime = float(arquivo.read().split()[0])
+        inicio = int(campos[19]) / os.sysconf('SC_CLK_TCK')
+        return max(0.0, uptime - inicio)
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - INICIO_MODULO
+
+
+class Aquecimento:
+    """Executa as etapas de aquecimento em uma thread e expõe o progresso"""
+
+    def __init__(self):
+        self._etapas = []
+        self._lock = threading.Lock()
+        self._pid = None
+        self._iniciar_estado()
+
+    def _iniciar_estado(self):
+        """Zera o progresso (também chamado no processo filho após fork)"""
+        self._pronto = threading.Event()
+        self._etapa_atual = None
+        self._resultados = {}
+        self._inicio = None
+        self._duracao = None
+        self._processo_pronto_em = None
+
+    def etapa(self, nome):
+        """Decorator: registra funcao() como etapa, na ordem de declaração"""
+        def registrar(funcao):
+            self._etapas.append((nome, funcao))
+            return funcao
+        return registrar
+
+    def marcar_processo_pronto(self):
+        """Registra quanto o processo levou para poder atender requisições"""
+        if self._processo_pronto_em is None:
+            self._processo_pronto_em = segundos_desde_inicio_processo()
+
+    def iniciar(self):
+        """Inicia o aquecimento neste processo (uma vez por pid)"""
+        if self._pid == os.getpid():
+            return  # Caminho rápido: chamado a cada requisição
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._iniciar_estado()
+            self.marcar_processo_pronto()
+            self._inicio = time.monotonic()
+
+        threading.Thread(target=self._executar, name='aquecimento', daemon=True).start()
+
+    def _executar(self):
+        for nome, funcao in self._etapas:
+            self._etapa_atual = nome
+            inicio = time.perf_counter()
+            resultado = {}
+            try:
+                detalhe = funcao()
+                if detalhe is not None:
+                    resultado['detalhe'] = detalhe
+            except Exception as e:
+                # Etapa com erro não impede o serviço: fica registrada no /ready
+                print(f"⚠️  Aquecimento: erro na etapa {nome}: {e}")
+                resultado['erro'] = str(e)
+            resultado['ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+            self._resultados[nome] = resultado
+
+        self._etapa_atual = None
+        self._duracao = time.monotonic() - self._inicio
+        self._pronto.set()
+        print(f"🔥 Aquecimento concluído em {self._duracao * 1000:.0f}ms")
+
+    @property
+    def pronto(self):
+        return self._pronto.is_set()
+
+    def estado(self):
+        """Progresso para o /ready"""
+        return {
+            "pronto": self.pronto,
+            "etapa_atual": self._etapa_atual,
+            "etapas": dict(self._resultados)
+        }
+
+    def tempos(self):
+        """Tempos de boot para o /health"""
+        return {
+            "processo_pronto_ms": round(self._processo_pronto_em * 1000) if self._processo_pronto_em is not None else None,
+            "aquecimento_ms": round(self._duracao * 1000) if self._duracao is not None else None,
+            "pronto": self.pronto,
+            "uptime_s": round(segundos_desde_inicio_processo(), 1)
+        }
@@ -0,0 +1,312 @@
+"""
+API Ciclik - Modo assíncrono (ASGI)
+Mesmas rotas e respostas do app.py (Flask), mas as consultas à Cosmos são
+aguardadas com asyncio em vez de bloquear um worker por até 10s. Um único
+processo mantém centenas de consultas em andamento e o /health continua
+respondendo mesmo com a Cosmos lenta.
+
+Execução (Render → Start Command):
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT
+
+Rotas (contratos idênticos ao app.py):
+- GET  /
+- GET  /health
+- GET  /ready
+- GET  /api/status/tokens
+- GET  /metrics
+- GET  /api/produtos/{gtin}
+- POST /api/produtos/lote
+
+Tokens, caches, validação e formatação vêm do próprio app.py; aqui fica
+apenas o transporte HTTP e a rotação de tokens em versão assíncrona.
+O Flask não é importado neste modo (app.criar_app só roda no gunicorn).
+"""
+
+import asyncio
+import http.client
+import json
+import re
+import time
+
+import app as api
+from cliente_cosmos import ClienteHTTPAsync
+from respostas_http import RespostaPronta, serializar
+
+
+cliente_cosmos_async = ClienteHTTPAsync(
+    api.COSMOS_BASE_URL,
+    api.COSMOS_POOL_TAMANHO,
+    api.COSMOS_TIMEOUT_CONEXAO,
+    api.COSMOS_TIMEOUT_LEITURA,
+    ssl_context=api.ssl_context
+)
+
+ROTA_PRODUTO = re.compile(r'^/api/produtos/([^/]+)$')
+
+# Caches carregados em segundo plano; /health já responde enquanto isso
+api.iniciar_aquecimento()
+
+
+# ==================== CONSULTA ASSÍNCRONA À COSMOS ====================
+
+async def consultar_cosmos_async(gtin, token):
+    """Consulta a API Cosmos Bluesoft usando um token específico (sem bloquear)"""
+    inicio = time.perf_counter()
+    try:
+        status_code, _, corpo = await cliente_cosmos_async.get(
+            f'/gtins/{gtin}.json', api.headers_cosmos(token)
+        )
+        api.registrar_consulta_cosmos(inicio, status_code)
+        return api.interpretar_resposta_cosmos(status_code, corpo)
+
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, OSError, http.client.HTTPException) as e:
+        api.registrar_consulta_cosmos(inicio, None)
+        return None, f"Erro de conexão: {str(e) or type(e).__name__}", None
+
+    except Exception as e:
+        return None, f"Erro inesperado: {str(e)}", None
+
+
+async def consultar_bluesoft_com_rotacao_async(gtin):
+    """
+    Versão assíncrona de app.consultar_bluesoft_com_rotacao.
+    Se um token retorna 429 (rate limit), tenta o próximo. O ledger de
+    tokens é SQLite (BEGIN IMMEDIATE, pode esperar o lock): roda em thread.
+    """
+    tentativas = 0
+    max_tentativas = len(api.TOKENS)
+
+    while tentativas < max_tentativas:
+        token = await asyncio.to_thread(api.get_available_token)
+
+        if not token:
+            return None, api.mensagem_tokens_esgotados(), 429
+
+        data, erro, status_code = await consultar_cosmos_async(gtin, token)
+
+        if status_code == 429:
+            await asyncio.to_thread(api.marcar_token_esgotado, token)
+            tentativas += 1
+            continue
+
+        if status_code != 200 and status_code != 404:
+            await asyncio.to_thread(api.release_token_usage, token)
+
+        return data, erro, status_code
+
+    return None, "Todos os tokens atingiram o limite de consultas", 429
+
+
+async def resolver_produto_async(gtin):
+    """Resolve um GTIN pelo cache ou pela Cosmos; retorna (corpo, status HTTP)"""
+    # Cache em SQLite roda em thread para não travar o event loop
+    resultado_local, canonico = await asyncio.to_thread(api.resolver_local, gtin)
+    if resultado_local:
+        return resultado_local
+
+    # Requisições simultâneas para o mesmo GTIN aguardam a mesma consulta
+    async def consultar():
+        resultado_cache = await asyncio.to_thread(api.reconferir_cache, canonico)
+        if resultado_cache:
+            return resultado_cache
+        data, erro, status_code = await consultar_bluesoft_com_rotacao_async(
+            api.gtin_para_consulta(canonico)
+        )
+        return await asyncio.to_thread(api.montar_resposta, canonico, data, erro, status_code)
+
+    return await api.consultas_em_andamento.executar_async(canonico, consultar)
+
+
+async def resolver_produto_pronto_async(gtin):
+    """Versão assíncrona de app.resolver_produto_pronto (RespostaPronta em bytes)"""
+    pronta, canonico = api.obter_resposta_pronta(gtin)
+    if pronta:
+        return pronta
+
+    resposta, status_http = await resolver_produto_async(gtin)
+    return api.preparar_resposta_pronta(canonico, resposta, status_http)
+
+
+async def resolver_lote_async(gtins):
+    """Resolve vários GTINs com no máximo LOTE_MAX_CONCORRENCIA em paralelo"""
+    vagas = asyncio.Semaphore(api.LOTE_MAX_CONCORRENCIA)
+
+    async def resolver_com_limite(gtin):
+        async with vagas:
+            return await resolver_produto_async(gtin)
+
+    return await asyncio.gather(*(resolver_com_limite(g) for g in gtins))
+
+
+# ==================== TRANSPORTE ASGI ====================
+
+async def enviar_bytes(send, status_http, conteudo, headers_extras=(), sem_corpo=False):
+    """Envia um corpo já pronto com CORS liberado (como o flask_cors)"""
+    headers = [
+        (b'content-length', str(len(conteudo)).encode()),
+        (b'access-control-allow-origin', b'*'),
+    ]
+    headers.extend(headers_extras)
+
+    await send({'type': 'http.response.start', 'status': status_http, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': b'' if sem_corpo else conteudo})
+
+
+async def enviar(send, status_http, corpo=None, headers_extras=(), sem_corpo=False):
+    """Envia JSON, ou texto puro quando o corpo já é uma string (/metrics)"""
+    if isinstance(corpo, str):
+        conteudo, tipo = corpo.encode(), api.TIPO_CONTEUDO.encode()
+    else:
+        conteudo, tipo = (serializar(corpo) if corpo is not None else b''), b'application/json'
+
+    await enviar_bytes(send, status_http, conteudo, [(b'content-type', tipo), *headers_extras], sem_corpo)
+
+
+async def enviar_produto(send, status_http, corpo, headers, sem_corpo=False):
+    """
+    Resposta de produto com ETag/304, Cache-Control e compressão (respostas_http).
+    corpo é uma RespostaPronta (consulta) ou um dict (erro de autorização).
+    """
+    if isinstance(corpo, RespostaPronta):
+        pronta = corpo
+    else:
+        pronta = api.respostas_produto.preparar(corpo, status_http)
+    status_http, conteudo, headers_http = api.respostas_produto.enviar(
+        pronta, headers.get('accept-encoding'), headers.get('if-none-match')
+    )
+    headers_extras = [(k.lower().encode(), v.encode()) for k, v in headers_http.items()]
+    await enviar_bytes(send, status_http, conteudo, headers_extras, sem_corpo or status_http == 304)
+    return status_http
+
+
+async def ler_corpo(receive):
+    """Lê o body completo da requisição"""
+    partes = []
+    while True:
+        mensagem = await receive()
+        partes.append(mensagem.get('body', b''))
+        if not mensagem.get('more_body'):
+            return b''.join(partes)
+
+
+async def tratar_lifespan(receive, send):
+    """Eventos de inicialização/encerramento do servidor ASGI"""
+    while True:
+        mensagem = await receive()
+        if mensagem['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif mensagem['type'] == 'lifespan.shutdown':
+            await cliente_cosmos_async.fechar()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def rotear(metodo, caminho, headers, receive):
+    """Despacha a requisição para a rota correspondente; retorna (corpo, status)"""
+    autorizacao = headers.get('authorization')
+
+    if caminho == '/' and metodo == 'GET':
+        return api.info_api(), 200
+
+    if caminho == '/health' and metodo == 'GET':
+        return await asyncio.to_thread(api.info_health), 200
+
+    if caminho == '/ready' and metodo == 'GET':
+        return api.info_ready()
+
+    if caminho == '/api/status/tokens' and metodo == 'GET':
+        erro = api.checar_autorizacao(autorizacao, obrigatoria=False)
+        if erro:
+            return erro
+        return await asyncio.to_thread(api.get_token_status), 200
+
+    if caminho == '/metrics' and metodo == 'GET':
+        erro = api.checar_autorizacao(autorizacao, obrigatoria=False)
+        if erro:
+            return erro
+        return await asyncio.to_thread(api.metricas.exportar), 200
+
+    if caminho == '/api/produtos/lote' and metodo == 'POST':
+        erro = api.checar_autorizacao(autorizacao)
+        if erro:
+            return erro
+
+        try:
+            corpo = json.loads(await ler_corpo(receive) or b'null')
+        except ValueError:
+            corpo = None
+
+        gtins_unicos, total_recebido, erro = api.preparar_lote(corpo)
+        if erro:
+            return erro
+
+        respostas = await resolver_lote_async(gtins_unicos)
+        return api.montar_resultado_lote(gtins_unicos, total_recebido, respostas), 200
+
+    rota_produto = ROTA_PRODUTO.match(caminho)
+    if rota_produto and metodo == 'GET':
+        erro = api.checar_autorizacao(autorizacao)
+        if erro:
+            return erro
+        pronta = await resolver_produto_pronto_async(rota_produto.group(1))
+        return pronta, pronta.status_http
+
+    return {
+        "erro": "Endpoint não encontrado",
+        "mensagem": "Verifique a URL e tente novamente"
+    }, 404
+
+
+def rota_da_requisicao(caminho):
+    """Rótulo da rota nas métricas, igual ao da regra do Flask"""
+    if caminho in ('/', '/health', '/ready', '/api/status/tokens', '/metrics', '/api/produtos/lote'):
+        return caminho
+    if ROTA_PRODUTO.match(caminho):
+        return '/api/produtos/<gtin>'
+    return 'desconhecida'
+
+
+async def app(scope, receive, send):
+    """Aplicação ASGI (uvicorn asgi:app)"""
+    if scope['type'] == 'lifespan':
+        await tratar_lifespan(receive, send)
+        return
+
+    if scope['type'] != 'http':
+        return
+
+    metodo = scope['method']
+    headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope['headers']}
+
+    # Preflight CORS (o flask_cors responde isso automaticamente no app.py)
+    if metodo == 'OPTIONS':
+        await enviar(send, 200, headers_extras=[
+            (b'access-control-allow-methods', b'GET, HEAD, POST, OPTIONS'),
+            (b'access-control-allow-headers',
+             headers.get('access-control-request-headers', '*').encode('latin-1')),
+        ])
+        return
+
+    inicio = time.perf_counter()
+    api.metrica_em_andamento.inc()
+    try:
+        try:
+            corpo, status_http = await rotear(
+                'GET' if metodo == 'HEAD' else metodo, scope['path'], headers, receive
+            )
+        except Exception as e:
+            print(f"❌ Erro interno: {e}")
+            corpo, status_http = {
+                "erro": "Erro interno do servidor",
+                "mensagem": "Entre em contato com o suporte"
+            }, 500
+
+        if ROTA_PRODUTO.match(scope['path']) and metodo in ('GET', 'HEAD'):
+            status_http = await enviar_produto(send, status_http, corpo, headers, sem_corpo=metodo == 'HEAD')
+        else:
+            await enviar(send, status_http, corpo, sem_corpo=metodo == 'HEAD')
+        api.registrar_requisicao(
+            rota_da_requisicao(scope['path']), metodo, status_http, time.perf_counter() - inicio
+        )
+    finally:
+        api.metrica_em_andamento.dec()
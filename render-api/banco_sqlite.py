@@ -0,0 +1,47 @@
+"""
+Conexão SQLite compartilhada pelos arquivos locais da API
+(cache de produtos, ledger de tokens e índice de prefixos GS1).
+
+- Uma conexão por processo: reaberta após o fork dos workers do gunicorn
+- Cria a pasta do arquivo e liga o WAL (leitores não bloqueiam o escritor)
+- preparar(conexao) cria as tabelas na primeira abertura de cada processo
+"""
+
+import os
+import sqlite3
+
+
+class ConexaoSQLite:
+    """Abre o arquivo sob demanda e reabre quando o PID muda (fork)"""
+
+    def __init__(self, caminho, preparar, timeout=5, isolation_level='', synchronous=None):
+        self.caminho = caminho
+        self.preparar = preparar
+        self.timeout = timeout
+        # '' é o padrão do sqlite3; None = transações controladas manualmente
+        self.isolation_level = isolation_level
+        self.synchronous = synchronous
+        self._conexao = None
+        self._pid = None
+
+    def conectar(self):
+        """Conexão deste processo (quem chama protege o uso com o próprio lock)"""
+        if self._conexao is not None and self._pid == os.getpid():
+            return self._conexao
+
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+
+        conexao = sqlite3.connect(
+            self.caminho, timeout=self.timeout,
+            isolation_level=self.isolation_level, check_same_thread=False
+        )
+        conexao.execute("PRAGMA journal_mode=WAL")
+        if self.synchronous:
+            conexao.execute(f"PRAGMA synchronous={self.synchronous}")
+        self.preparar(conexao)
+
+        self._conexao = conexao
+        self._pid = os.getpid()
+        return conexao
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Benchmark de carga da API (app.py / asgi.py) contra uma Cosmos falsa local
+Sobe a API num processo separado apontando COSMOS_BASE_URL para a Cosmos
+falsa (latência e taxas de 404/429 ajustáveis), dispara clientes
+simultâneos sobre um catálogo de GTINs com produtos "quentes" (muito
+escaneados) e "frios", e mede vazão, latência, erros e créditos gastos.
+
+Execute:
+    python benchmark_carga.py --clientes 16 --requisicoes 2000
+    python benchmark_carga.py --servidor uvicorn --latencia-cosmos 800 --json resultado.json
+    python benchmark_carga.py --accept-encoding gzip --ambiente RESPOSTAS_PRONTAS_MAX_ITENS=0
+
+O JSON inclui a configuração e o commit atual, para comparar versões.
+"""
+
+import argparse
+import gzip
+import http.client
+import json
+import os
+import random
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+PASTA_API = os.path.dirname(os.path.abspath(__file__))
+
+# Cosmos falsa compartilhada com o benchmark do processamento automático
+sys.path.insert(0, os.path.join(PASTA_API, '..', 'scripts', 'processamento-automatico'))
+from metricas import percentil
+from servidores_falsos import CosmosFalso
+from validacao_gtin import digito_verificador
+
+API_TOKEN = 'benchmark'
+
+
+# ==================== SERVIDOR DA API ====================
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def comando_servidor(servidor, porta, workers):
+    """Linha de comando para subir a API como no Render"""
+    if servidor == 'gunicorn':
+        return ['gunicorn', 'app:app', '-b', f'127.0.0.1:{porta}',
+                '-w', str(workers), '--threads', '8', '--log-level', 'warning']
+    if servidor == 'uvicorn':
+        return [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1',
+                '--port', str(porta), '--log-level', 'warning']
+    # Servidor de desenvolvimento do Flask, uma thread por requisição
+    return [sys.executable, '-c',
+            f"import app; app.app.run(host='127.0.0.1', port={porta}, threaded=True)"]
+
+
+def aguardar_api(porta, caminho='/health', prazo=30):
+    """Espera a rota responder 200 (/health: processo no ar; /ready: caches aquecidos)"""
+    limite = time.time() + prazo
+    while time.time() < limite:
+        try:
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=2)
+            conexao.request('GET', caminho)
+            if conexao.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.02)
+    return False
+
+
+def cpu_filhos():
+    """CPU (s) consumida pelos processos filhos já encerrados"""
+    uso = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return uso.ru_utime + uso.ru_stime
+
+
+# ==================== CARGA ====================
+
+def gerar_catalogo(quantidade, seed):
+    """GTINs válidos (EAN-13 com prefixo 789)"""
+    aleatorio = random.Random(seed)
+    catalogo = set()
+    while len(catalogo) < quantidade:
+        corpo = '789' + ''.join(str(aleatorio.randint(0, 9)) for _ in range(9))
+        catalogo.add(corpo + str(digito_verificador(corpo)))
+    return sorted(catalogo)
+
+
+class Carga:
+    """Clientes simultâneos com conexão keep-alive própria"""
+
+    def __init__(self, porta, catalogo, quentes, trafego_quente, seed, accept_encoding=None):
+        self.porta = porta
+        self.accept_encoding = accept_encoding
+        corte = max(1, int(len(catalogo) * quentes))
+        self.quentes = catalogo[:corte]
+        self.frios = catalogo[corte:] or self.quentes
+        self.trafego_quente = trafego_quente
+        self.seed = seed
+        self._lock = threading.Lock()
+        self.amostras = []  # (latência ms, status, origem)
+
+    def sortear_gtin(self, aleatorio):
+        if aleatorio.random() < self.trafego_quente:
+            return aleatorio.choice(self.quentes)
+        return aleatorio.choice(self.frios)
+
+    def cliente(self, indice, requisicoes):
+        aleatorio = random.Random(f"{self.seed}-{indice}")
+        conexao = http.client.HTTPConnection('127.0.0.1', self.porta, timeout=60)
+        headers = {'Authorization': f'Bearer {API_TOKEN}'}
+        if self.accept_encoding:
+            headers['Accept-Encoding'] = self.accept_encoding
+        amostras = []
+
+        for _ in range(requisicoes):
+            gtin = self.sortear_gtin(aleatorio)
+            inicio = time.perf_counter()
+            try:
+                conexao.request('GET', f'/api/produtos/{gtin}', headers=headers)
+                resposta = conexao.getresponse()
+                corpo = resposta.read()
+                status = resposta.status
+                if resposta.getheader('Content-Encoding') == 'gzip':
+                    corpo = gzip.decompress(corpo)
+                try:
+                    origem = json.loads(corpo).get('origem')
+                except ValueError:
+                    origem = None
+            except (OSError, http.client.HTTPException):
+                conexao.close()
+                conexao = http.client.HTTPConnection('127.0.0.1', self.porta, timeout=60)
+                status, origem = 'erro_conexao', None
+            amostras.append(((time.perf_counter() - inicio) * 1000, status, origem))
+
+        conexao.close()
+        with self._lock:
+            self.amostras.extend(amostras)
+
+    def executar(self, clientes, requisicoes):
+        por_cliente = [requisicoes // clientes + (1 if i < requisicoes % clientes else 0)
+                       for i in range(clientes)]
+        threads = [threading.Thread(target=self.cliente, args=(i, n)) for i, n in enumerate(por_cliente)]
+        inicio = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - inicio
+
+
+def resumir_latencias(valores):
+    valores = sorted(valores)
+    return {
+        'quantidade': len(valores),
+        'p50_ms': round(percentil(valores, 50), 2),
+        'p90_ms': round(percentil(valores, 90), 2),
+        'p99_ms': round(percentil(valores, 99), 2),
+        'max_ms': round(valores[-1], 2) if valores else 0.0
+    }
+
+
+def commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PASTA_API,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def consultar_status(porta):
+    conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=10)
+    conexao.request('GET', '/api/status/tokens', headers={'Authorization': f'Bearer {API_TOKEN}'})
+    return json.loads(conexao.getresponse().read())
+
+
+# ==================== EXECUÇÃO ====================
+
+def executar(args):
+    cosmos = CosmosFalso(
+        latencia=args.latencia_cosmos / 1000,
+        taxa_404=args.taxa_404,
+        taxa_429=args.taxa_429,
+        seed=args.seed
+    ).iniciar()
+
+    pasta = tempfile.mkdtemp(prefix='benchmark-api-')
+    porta = porta_livre()
+    ambiente = dict(os.environ, **{
+        'API_TOKEN': API_TOKEN,
+        'COSMOS_BASE_URL': cosmos.url,
+        'PASTA_DADOS': pasta,
+        'PORT': str(porta),
+    })
+    ambiente.update(dict(item.split('=', 1) for item in args.ambiente))
+    for i in range(1, args.tokens + 1):
+        ambiente[f'BLUESOFT_TOKEN_{i}'] = f'token-benchmark-{i}'
+
+    saida = None if args.verboso else subprocess.DEVNULL
+    cpu_antes = cpu_filhos()
+    inicio_boot = time.perf_counter()
+    processo = subprocess.Popen(
+        comando_servidor(args.servidor, porta, args.workers),
+        cwd=PASTA_API, env=ambiente, stdout=saida, stderr=saida
+    )
+
+    try:
+        if not aguardar_api(porta):
+            raise RuntimeError("API não respondeu ao /health")
+        boot_health = time.perf_counter() - inicio_boot
+        aguardar_api(porta, '/ready')
+        boot_ready = time.perf_counter() - inicio_boot
+
+        carga = Carga(porta, gerar_catalogo(args.gtins, args.seed), args.quentes, args.trafego_quente,
+                      args.seed, args.accept_encoding)
+        duracao = carga.executar(args.clientes, args.requisicoes)
+        status_api = consultar_status(porta)
+    finally:
+        processo.send_signal(signal.SIGTERM)
+        try:
+            processo.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            processo.kill()
+            processo.wait()
+        cosmos.parar()
+    cpu_servidor = cpu_filhos() - cpu_antes
+
+    total = len(carga.amostras)
+    por_status = {}
+    for _, status, _ in carga.amostras:
+        por_status[str(status)] = por_status.get(str(status), 0) + 1
+    erros = total - por_status.get('200', 0)
+
+    por_origem = {}
+    for latencia, status, origem in carga.amostras:
+        if status == 200:
+            por_origem.setdefault(origem or 'desconhecida', []).append(latencia)
+
+    return {
+        'versao': {'commit': commit_atual(), 'data': datetime.now().isoformat(timespec='seconds')},
+        'configuracao': {
+            'servidor': args.servidor,
+            'workers': args.workers,
+            'clientes': args.clientes,
+            'requisicoes': args.requisicoes,
+            'gtins': args.gtins,
+            'quentes': args.quentes,
+            'trafego_quente': args.trafego_quente,
+            'latencia_cosmos_ms': args.latencia_cosmos,
+            'taxa_404': args.taxa_404,
+            'taxa_429': args.taxa_429,
+            'tokens': args.tokens,
+            'accept_encoding': args.accept_encoding,
+            'ambiente': args.ambiente,
+            'seed': args.seed
+        },
+        'resultado': {
+            'boot_health_ms': round(boot_health * 1000),
+            'boot_ready_ms': round(boot_ready * 1000),
+            'duracao_s': round(duracao, 3),
+            'requisicoes_por_segundo': round(total / duracao, 1) if duracao else 0,
+            'latencia': resumir_latencias([a[0] for a in carga.amostras]),
+            'latencia_por_origem': {o: resumir_latencias(v) for o, v in sorted(por_origem.items())},
+            'status_http': dict(sorted(por_status.items())),
+            'taxa_erros': round(erros / total, 4) if total else 0,
+            'taxa_429': round(por_status.get('429', 0) / total, 4) if total else 0,
+            'cpu_servidor_s': round(cpu_servidor, 3),
+            'cpu_ms_por_requisicao': round(cpu_servidor * 1000 / total, 3) if total else 0
+        },
+        'cosmos': {
+            'chamadas': cosmos.pedidos.get('/gtins', 0),
+            'creditos_gastos': cosmos.creditos_gastos,
+            'uso_por_token': dict(sorted(cosmos.uso_tokens.items()))
+        },
+        'api': {
+            'tokens': status_api.get('resumo'),
+            'cache': status_api.get('cache'),
+            'cache_nao_encontrados': status_api.get('cache_nao_encontrados'),
+            'coalescencia': status_api.get('coalescencia'),
+            'respostas_prontas': status_api.get('respostas_prontas')
+        }
+    }
+
+
+def imprimir(resultado):
+    r = resultado['resultado']
+    print("=" * 60)
+    print(f"📏 BENCHMARK DE CARGA - {resultado['configuracao']['servidor']} (commit {resultado['versao']['commit']})")
+    print("=" * 60)
+    print(f"🌅 Boot: /health em {r['boot_health_ms']}ms | /ready em {r['boot_ready_ms']}ms")
+    print(f"⚡ {r['requisicoes_por_segundo']} req/s em {r['duracao_s']}s")
+    l = r['latencia']
+    print(f"⏱️ Latência: p50 {l['p50_ms']}ms | p90 {l['p90_ms']}ms | p99 {l['p99_ms']}ms | max {l['max_ms']}ms")
+    for origem, lo in r['latencia_por_origem'].items():
+        print(f"   {origem:<10} {lo['quantidade']:>6} req | p50 {lo['p50_ms']}ms | p99 {lo['p99_ms']}ms")
+    print(f"📊 Status HTTP: {r['status_http']} (erros: {r['taxa_erros']:.1%})")
+    print(f"💳 Créditos gastos na Cosmos: {resultado['cosmos']['creditos_gastos']}")
+    print(f"🖥️ CPU do servidor: {r['cpu_servidor_s']}s ({r['cpu_ms_por_requisicao']}ms/req)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de carga da API contra uma Cosmos falsa')
+    parser.add_argument('--servidor', choices=['flask', 'gunicorn', 'uvicorn'], default='flask')
+    parser.add_argument('--workers', type=int, default=2, help='Workers do gunicorn')
+    parser.add_argument('--clientes', type=int, default=16, help='Clientes simultâneos')
+    parser.add_argument('--requisicoes', type=int, default=2000, help='Total de requisições')
+    parser.add_argument('--gtins', type=int, default=500, help='Tamanho do catálogo de GTINs')
+    parser.add_argument('--quentes', type=float, default=0.05, help='Fração do catálogo que é "quente"')
+    parser.add_argument('--trafego-quente', type=float, default=0.8, help='Fração das requisições para GTINs quentes')
+    parser.add_argument('--latencia-cosmos', type=float, default=300, help='ms por consulta à Cosmos')
+    parser.add_argument('--taxa-404', type=float, default=0.2)
+    parser.add_argument('--taxa-429', type=float, default=0.0)
+    parser.add_argument('--tokens', type=int, default=4, help='Tokens Bluesoft configurados (25 créditos cada)')
+    parser.add_argument('--accept-encoding', default=None, help='Accept-Encoding enviado pelos clientes (ex.: gzip)')
+    parser.add_argument('--ambiente', action='append', default=[], metavar='CHAVE=VALOR',
+                        help='Variável de ambiente extra para a API (repetível)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', dest='arquivo_json', help='Grava o resultado neste arquivo')
+    parser.add_argument('--verboso', action='store_true', help='Mostra o log da API')
+    args = parser.parse_args()
+
+    resultado = executar(args)
+    imprimir(resultado)
+
+    if args.arquivo_json:
+        with open(args.arquivo_json, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+        print(f"\n💾 Resultado salvo em {args.arquivo_json}")
+
+
+if __name__ == '__main__':
+    main()
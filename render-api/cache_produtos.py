@@ -0,0 +1,167 @@
+"""
+Cache persistente de produtos (SQLite)
+Guarda a resposta já formatada (formatar_resposta) de cada GTIN consultado
+na Cosmos, para que consultas repetidas não gastem créditos diários.
+
+- Sobrevive a reinícios do processo (arquivo em disco)
+- Expiração por TTL (CACHE_TTL_HORAS)
+- Limite de tamanho com remoção dos itens menos acessados (CACHE_MAX_ITENS)
+- Seguro para várias threads e vários workers do gunicorn (modo WAL)
+- Uma tabela por instância: permite um cache negativo (produtos não
+  encontrados) no mesmo arquivo, com TTL próprio
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+from banco_sqlite import ConexaoSQLite
+
+
+class CacheProdutos:
+    """Cache de respostas da Cosmos em SQLite, com TTL e limite de itens"""
+
+    def __init__(self, caminho, ttl_segundos, max_itens, tabela='produtos'):
+        self.caminho = caminho
+        self.tabela = tabela
+        self.ttl_segundos = ttl_segundos
+        self.max_itens = max_itens
+        self._lock = threading.Lock()
+        self._banco = ConexaoSQLite(caminho, self._criar_tabela, synchronous='NORMAL')
+
+    def _criar_tabela(self, conexao):
+        """Tabela de respostas e índice da ordem de acesso (LRU)"""
+        conexao.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.tabela} (
+                gtin TEXT PRIMARY KEY,
+                resposta TEXT NOT NULL,
+                criado_em REAL NOT NULL,
+                acessado_em REAL NOT NULL
+            )
+        """)
+        conexao.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{self.tabela}_acessado_em ON {self.tabela} (acessado_em)"
+        )
+        conexao.commit()
+
+    def obter(self, gtin):
+        """Retorna a resposta em cache do GTIN, ou None se ausente/expirada"""
+        agora = time.time()
+        try:
+            with self._lock:
+                conexao = self._banco.conectar()
+                linha = conexao.execute(
+                    f"SELECT resposta, criado_em FROM {self.tabela} WHERE gtin = ?",
+                    (gtin,)
+                ).fetchone()
+
+                if not linha:
+                    return None
+
+                resposta, criado_em = linha
+                if agora - criado_em > self.ttl_segundos:
+                    conexao.execute(f"DELETE FROM {self.tabela} WHERE gtin = ?", (gtin,))
+                    conexao.commit()
+                    return None
+
+                self._marcar_acesso(conexao, gtin, agora)
+            return json.loads(resposta)
+
+        except sqlite3.Error as e:
+            # Cache nunca deve derrubar a consulta: segue para a Cosmos
+            print(f"⚠️  Erro ao ler cache ({gtin}): {e}")
+            return None
+
+    def _marcar_acesso(self, conexao, gtin, agora):
+        """
+        Atualiza acessado_em (ordem do LRU). Só afeta a remoção de excedentes:
+        se falhar (ex.: arquivo bloqueado por outro worker), a resposta lida
+        continua valendo.
+        """
+        try:
+            conexao.execute(
+                f"UPDATE {self.tabela} SET acessado_em = ? WHERE gtin = ?",
+                (agora, gtin)
+            )
+            conexao.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️  Erro ao atualizar acesso do cache ({gtin}): {e}")
+            try:
+                conexao.rollback()
+            except sqlite3.Error:
+                pass
+
+    def salvar(self, gtin, resposta):
+        """Grava a resposta formatada do GTIN e aplica o limite de tamanho"""
+        agora = time.time()
+        try:
+            with self._lock:
+                conexao = self._banco.conectar()
+                conexao.execute(
+                    f"INSERT OR REPLACE INTO {self.tabela} (gtin, resposta, criado_em, acessado_em) "
+                    "VALUES (?, ?, ?, ?)",
+                    (gtin, json.dumps(resposta, ensure_ascii=False), agora, agora)
+                )
+                self._remover_excedentes(conexao)
+                conexao.commit()
+
+        except sqlite3.Error as e:
+            print(f"⚠️  Erro ao gravar cache ({gtin}): {e}")
+
+    def _remover_excedentes(self, conexao):
+        """Remove os itens acessados há mais tempo quando passa de max_itens"""
+        total = conexao.execute(f"SELECT COUNT(*) FROM {self.tabela}").fetchone()[0]
+        excedente = total - self.max_itens
+        if excedente > 0:
+            conexao.execute(
+                f"DELETE FROM {self.tabela} WHERE gtin IN ("
+                f"SELECT gtin FROM {self.tabela} ORDER BY acessado_em ASC LIMIT ?)",
+                (excedente,)
+            )
+
+    def itens(self):
+        """Lista (gtin, resposta) de todos os itens ainda válidos"""
+        limite = time.time() - self.ttl_segundos
+        try:
+            with self._lock:
+                linhas = self._banco.conectar().execute(
+                    f"SELECT gtin, resposta FROM {self.tabela} WHERE criado_em >= ?",
+                    (limite,)
+                ).fetchall()
+        except sqlite3.Error as e:
+            print(f"⚠️  Erro ao listar cache: {e}")
+            return []
+
+        return [(gtin, json.loads(resposta)) for gtin, resposta in linhas]
+
+    def mais_acessados(self, limite):
+        """Lista (gtin, resposta) dos itens válidos acessados mais recentemente"""
+        minimo = time.time() - self.ttl_segundos
+        try:
+            with self._lock:
+                linhas = self._banco.conectar().execute(
+                    f"SELECT gtin, resposta FROM {self.tabela} WHERE criado_em >= ? "
+                    "ORDER BY acessado_em DESC LIMIT ?",
+                    (minimo, limite)
+                ).fetchall()
+        except sqlite3.Error as e:
+            print(f"⚠️  Erro ao listar cache: {e}")
+            return []
+
+        return [(gtin, json.loads(resposta)) for gtin, resposta in linhas]
+
+    def estatisticas(self):
+        """Resumo do cache para monitoramento"""
+        try:
+            with self._lock:
+                conexao = self._banco.conectar()
+                total = conexao.execute(f"SELECT COUNT(*) FROM {self.tabela}").fetchone()[0]
+        except sqlite3.Error:
+            total = None
+
+        return {
+            "itens": total,
+            "max_itens": self.max_itens,
+            "ttl_horas": self.ttl_segundos / 3600
+        }
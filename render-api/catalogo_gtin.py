@@ -0,0 +1,314 @@
+"""
+Catálogo local de GTINs em arquivo binário mapeado em memória (mmap)
+Dumps grandes de produtos (exportações de dados_api, catálogos de
+fornecedores) viram um arquivo compacto consultado antes da Cosmos: a
+busca é binária sobre as chaves mapeadas, leva microssegundos e quase não
+ocupa memória residente — as páginas vêm do cache do sistema operacional e
+são compartilhadas por todos os workers do gunicorn (arquivo só leitura).
+
+Formato do arquivo (inteiros little-endian de 64 bits):
+- cabeçalho: assinatura b'CICLIKGT' + quantidade N de GTINs
+- chaves: N GTINs canônicos (14 dígitos) como inteiros, em ordem crescente
+- offsets: N + 1 posições no blob (registro i = blob[offsets[i]:offsets[i+1]])
+- blob: registros JSON (UTF-8) no formato de formatar_resposta
+
+O importador grava em um arquivo temporário e troca com os.replace; a API
+percebe a troca (verificação a cada poucos segundos) e passa a usar o novo
+arquivo sem reinício.
+
+Uso (importador):
+    python catalogo_gtin.py exportacao.jsonl fornecedor.csv
+    python catalogo_gtin.py produtos.csv -o /var/data/catalogo_gtin.bin
+"""
+
+import argparse
+import bisect
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+
+from validacao_gtin import gtin_para_consulta, normalizar_gtin
+
+ASSINATURA = b'CICLIKGT'
+CABECALHO = struct.Struct('<8sQ')
+
+# Campos do formato Ciclik guardados no catálogo
+CAMPOS_PRODUTO = (
+    'descricao', 'marca', 'fabricante', 'categoria_api', 'ncm', 'ncm_completo',
+    'preco_medio', 'peso_liquido_em_gramas', 'peso_bruto_em_gramas', 'imagem_url'
+)
+
+# Nomes de coluna comuns em catálogos de fornecedores → campo Ciclik
+SINONIMOS = {
+    'gtin': 'ean_gtin',
+    'ean': 'ean_gtin',
+    'codigo_barras': 'ean_gtin',
+    'description': 'descricao',
+    'nome': 'descricao',
+    'brand': 'marca',
+    'manufacturer': 'fabricante',
+    'categoria': 'categoria_api',
+    'category': 'categoria_api',
+    'thumbnail': 'imagem_url',
+    'imagem': 'imagem_url',
+}
+
+MENSAGEM_CATALOGO = "Produto encontrado no catálogo local"
+
+# Campos vazios não são gravados no blob; a leitura os completa com None
+MODELO_PRODUTO = {"encontrado": True, "ean_gtin": None, **dict.fromkeys(CAMPOS_PRODUTO), "mensagem": MENSAGEM_CATALOGO}
+
+
+class CatalogoGTIN:
+    """Consulta somente leitura ao catálogo binário (vazio se o arquivo não existir)"""
+
+    def __init__(self, caminho, intervalo_verificacao=30):
+        self.caminho = caminho
+        self.intervalo_verificacao = intervalo_verificacao
+        self._lock = threading.Lock()
+        self._dados = None
+        self._assinatura_arquivo = None
+        self._proxima_verificacao = 0
+        self._atual()
+
+    def _abrir(self):
+        """Mapeia o arquivo e devolve (mmap, chaves, offsets, início do blob)"""
+        with open(self.caminho, 'rb') as arquivo:
+            mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+
+        assinatura, quantidade = CABECALHO.unpack_from(mapa, 0)
+        inicio_chaves = CABECALHO.size
+        inicio_offsets = inicio_chaves + 8 * quantidade
+        inicio_blob = inicio_offsets + 8 * (quantidade + 1)
+        if assinatura != ASSINATURA or len(mapa) < inicio_blob:
+            raise ValueError("arquivo não é um catálogo Ciclik válido")
+
+        # Visões diretas sobre o mmap: nada é copiado para a memória do processo
+        visao = memoryview(mapa)
+        chaves = visao[inicio_chaves:inicio_offsets].cast('Q')
+        offsets = visao[inicio_offsets:inicio_blob].cast('Q')
+        return mapa, chaves, offsets, inicio_blob
+
+    def _atual(self):
+        """Dados do catálogo, reabrindo o arquivo se ele foi trocado pelo importador"""
+        agora = time.monotonic()
+        if agora < self._proxima_verificacao:
+            return self._dados
+
+        with self._lock:
+            if agora < self._proxima_verificacao:
+                return self._dados
+            self._proxima_verificacao = agora + self.intervalo_verificacao
+
+            try:
+                info = os.stat(self.caminho)
+            except OSError:
+                self._dados, self._assinatura_arquivo = None, None
+                return None
+
+            assinatura = (info.st_ino, info.st_size, info.st_mtime_ns)
+            if assinatura != self._assinatura_arquivo:
+                try:
+                    # Leitores em andamento seguem com a referência antiga até terminar
+                    self._dados = self._abrir()
+                    print(f"📚 Catálogo local carregado: {len(self._dados[1])} GTINs ({self.caminho})")
+                except (OSError, ValueError, struct.error) as e:
+                    print(f"⚠️  Erro ao abrir catálogo local ({self.caminho}): {e}")
+                    self._dados = None
+                self._assinatura_arquivo = assinatura
+
+            return self._dados
+
+    def obter(self, canonico):
+        """Retorna o produto do GTIN canônico (14 dígitos), ou None se não estiver no catálogo"""
+        dados = self._atual()
+        if not dados:
+            return None
+
+        mapa, chaves, offsets, inicio_blob = dados
+        chave = int(canonico)
+        i = bisect.bisect_left(chaves, chave)
+        if i == len(chaves) or chaves[i] != chave:
+            return None
+
+        return {**MODELO_PRODUTO, **json.loads(mapa[inicio_blob + offsets[i]:inicio_blob + offsets[i + 1]])}
+
+    def aquecer(self):
+        """
+        Pede ao sistema que traga chaves e offsets para a memória (madvise),
+        para as primeiras buscas após o boot não esperarem o disco.
+        Retorna quantos GTINs o catálogo tem.
+        """
+        dados = self._atual()
+        if not dados:
+            return 0
+        mapa, chaves, _, inicio_blob = dados
+        if hasattr(mapa, 'madvise') and hasattr(mmap, 'MADV_WILLNEED'):
+            mapa.madvise(mmap.MADV_WILLNEED, 0, inicio_blob)
+        return len(chaves)
+
+    def estatisticas(self):
+        """Resumo do catálogo para monitoramento"""
+        dados = self._atual()
+        return {
+            "itens": len(dados[1]) if dados else 0,
+            "tamanho_bytes": len(dados[0]) if dados else 0,
+            "arquivo": os.path.basename(self.caminho)
+        }
+
+
+# ==================== IMPORTADOR ====================
+
+def ler_registros(caminho):
+    """Lê registros (dicts) de um CSV (separador , ou ;) ou de um JSONL"""
+    if caminho.lower().endswith('.csv'):
+        with open(caminho, encoding='utf-8-sig', newline='') as arquivo:
+            amostra = arquivo.read(4096)
+            arquivo.seek(0)
+            separador = ';' if amostra.count(';') > amostra.count(',') else ','
+            yield from csv.DictReader(arquivo, delimiter=separador)
+        return
+
+    with open(caminho, encoding='utf-8') as arquivo:
+        for linha in arquivo:
+            linha = linha.strip()
+            if linha:
+                yield json.loads(linha)
+
+
+def converter_numero(valor, tipo):
+    """Converte números vindos de CSV ("1.234,5", "500") ou mantém None"""
+    if valor is None or valor == '':
+        return None
+    if isinstance(valor, str):
+        valor = valor.strip()
+        if ',' in valor:
+            valor = valor.replace('.', '').replace(',', '.')
+    try:
+        return tipo(float(valor))
+    except (TypeError, ValueError):
+        return None
+
+
+def extrair_produto(registro):
+    """
+    Converte um registro de entrada em (GTIN canônico, produto no formato
+    Ciclik), ou None se não tiver GTIN válido ou descrição. Aceita linhas
+    exportadas de produtos_em_analise (com dados_api) ou registros planos.
+    """
+    if 'dados_api' in registro:
+        dados = registro['dados_api']
+        if isinstance(dados, str):
+            try:
+                dados = json.loads(dados)
+            except ValueError:
+                return None
+        if not isinstance(dados, dict) or not dados.get('encontrado'):
+            return None
+        dados = {**dados, 'ean_gtin': registro.get('ean_gtin') or dados.get('ean_gtin')}
+    else:
+        dados = {}
+        for chave, valor in registro.items():
+            chave = (chave or '').strip().lower()
+            dados[SINONIMOS.get(chave, chave)] = valor.strip() if isinstance(valor, str) else valor
+
+    canonico, _ = normalizar_gtin(dados.get('ean_gtin'))
+    if not canonico or not dados.get('descricao'):
+        return None
+
+    produto = {"encontrado": True, "ean_gtin": gtin_para_consulta(canonico)}
+    for campo in CAMPOS_PRODUTO:
+        valor = dados.get(campo)
+        produto[campo] = valor if valor != '' else None
+
+    produto['preco_medio'] = converter_numero(produto['preco_medio'], float)
+    produto['peso_liquido_em_gramas'] = converter_numero(produto['peso_liquido_em_gramas'], int)
+    produto['peso_bruto_em_gramas'] = converter_numero(produto['peso_bruto_em_gramas'], int)
+    if produto['marca'] and not produto['fabricante']:
+        produto['fabricante'] = produto['marca']
+
+    return canonico, produto
+
+
+def compilar_catalogo(entradas, destino):
+    """
+    Compila os arquivos de entrada no catálogo binário. Em GTINs repetidos
+    vale o último registro lido. Retorna as estatísticas da importação.
+    """
+    if sys.byteorder != 'little':
+        raise RuntimeError("O catálogo usa inteiros little-endian; compile em uma máquina x86/ARM")
+
+    registros = {}
+    estatisticas = {'lidos': 0, 'ignorados': 0, 'repetidos': 0}
+
+    for caminho in entradas:
+        for registro in ler_registros(caminho):
+            estatisticas['lidos'] += 1
+            extraido = extrair_produto(registro)
+            if not extraido:
+                estatisticas['ignorados'] += 1
+                continue
+            canonico, produto = extraido
+            chave = int(canonico)
+            if chave in registros:
+                estatisticas['repetidos'] += 1
+            compacto = {campo: valor for campo, valor in produto.items() if valor is not None and MODELO_PRODUTO.get(campo) != valor}
+            registros[chave] = json.dumps(compacto, ensure_ascii=False, separators=(',', ':')).encode()
+
+    chaves = array('Q', sorted(registros))
+    offsets = array('Q', [0])
+    for chave in chaves:
+        offsets.append(offsets[-1] + len(registros[chave]))
+
+    pasta = os.path.dirname(destino)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+
+    temporario = f"{destino}.tmp"
+    with open(temporario, 'wb') as arquivo:
+        arquivo.write(CABECALHO.pack(ASSINATURA, len(chaves)))
+        arquivo.write(chaves.tobytes())
+        arquivo.write(offsets.tobytes())
+        for chave in chaves:
+            arquivo.write(registros[chave])
+        arquivo.flush()
+        os.fsync(arquivo.fileno())
+    os.replace(temporario, destino)
+
+    estatisticas['gtins'] = len(chaves)
+    estatisticas['tamanho_bytes'] = os.path.getsize(destino)
+    return estatisticas
+
+
+def caminho_padrao():
+    """Mesmo caminho usado pela API (CATALOGO_GTIN_PATH ou $PASTA_DADOS/catalogo_gtin.bin)"""
+    pasta_dados = os.environ.get(
+        'PASTA_DADOS', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dados')
+    )
+    return os.environ.get('CATALOGO_GTIN_PATH', os.path.join(pasta_dados, 'catalogo_gtin.bin'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compila CSV/JSONL de produtos no catálogo binário de GTINs')
+    parser.add_argument('entradas', nargs='+', help='Arquivos .csv ou .jsonl (o último vence em GTINs repetidos)')
+    parser.add_argument('-o', '--saida', default=caminho_padrao(), help='Arquivo do catálogo gerado')
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    estatisticas = compilar_catalogo(args.entradas, args.saida)
+
+    print(f"📚 Catálogo gerado em {args.saida}")
+    print(f"   GTINs: {estatisticas['gtins']} ({estatisticas['tamanho_bytes'] / 1024 / 1024:.1f} MB)")
+    print(f"   Registros lidos: {estatisticas['lidos']} | ignorados: {estatisticas['ignorados']} "
+          f"| repetidos: {estatisticas['repetidos']}")
+    print(f"⏱️ {time.perf_counter() - inicio:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
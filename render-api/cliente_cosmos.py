@@ -0,0 +1,259 @@
+"""
+Cliente HTTP com pool de conexões keep-alive para a API Cosmos
+Reaproveita conexões TCP/TLS entre requisições e threads, evitando um novo
+handshake a cada consulta de GTIN.
+
+- Tamanho do pool configurável (conexões simultâneas por processo)
+- Timeouts separados de conexão e de leitura
+- Respostas com gzip são descompactadas automaticamente
+- Seguro para várias threads e para o fork dos workers do gunicorn
+- ClienteHTTPAsync: mesma ideia para o modo asyncio (asgi.py), sem
+  bloquear o event loop enquanto a Cosmos responde
+"""
+
+import asyncio
+import gzip
+import http.client
+import os
+import threading
+from queue import Empty, LifoQueue
+from urllib.parse import urlsplit
+
+
+# Erros que indicam que uma conexão reaproveitada foi fechada pelo servidor
+ERROS_CONEXAO_ENCERRADA = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+)
+
+
+class ClienteHTTPPool:
+    """Pool de conexões HTTP(S) keep-alive para um único host"""
+
+    def __init__(self, url_base, tamanho_pool, timeout_conexao, timeout_leitura, ssl_context=None):
+        partes = urlsplit(url_base)
+        self.https = partes.scheme == 'https'
+        self.host = partes.hostname
+        self.porta = partes.port or (443 if self.https else 80)
+        self.prefixo = partes.path.rstrip('/')
+        self.tamanho_pool = tamanho_pool
+        self.timeout_conexao = timeout_conexao
+        self.timeout_leitura = timeout_leitura
+        self.ssl_context = ssl_context
+        self._iniciar_pool()
+
+    def _iniciar_pool(self):
+        """Cria as estruturas do pool (também chamado após fork)"""
+        self._pid = os.getpid()
+        self._ociosas = LifoQueue()
+        self._vagas = threading.BoundedSemaphore(self.tamanho_pool)
+
+    def _criar_conexao(self):
+        """Abre uma conexão nova respeitando o timeout de conexão"""
+        if self.https:
+            conexao = http.client.HTTPSConnection(
+                self.host, self.porta, timeout=self.timeout_conexao, context=self.ssl_context
+            )
+        else:
+            conexao = http.client.HTTPConnection(self.host, self.porta, timeout=self.timeout_conexao)
+
+        conexao.connect()
+        # Após conectar, o socket passa a usar o timeout de leitura
+        conexao.sock.settimeout(self.timeout_leitura)
+        return conexao
+
+    def _obter_conexao(self):
+        """Retorna (conexão, reaproveitada) — ociosa do pool ou nova"""
+        try:
+            return self._ociosas.get_nowait(), True
+        except Empty:
+            return self._criar_conexao(), False
+
+    def get(self, caminho, headers=None):
+        """
+        Executa um GET e retorna (status, headers, corpo em bytes).
+        Exceções de rede (timeout, conexão recusada...) são propagadas.
+        """
+        if self._pid != os.getpid():
+            self._iniciar_pool()
+
+        headers = dict(headers or {})
+        headers.setdefault('Accept-Encoding', 'gzip')
+        headers.setdefault('Connection', 'keep-alive')
+
+        with self._vagas:
+            conexao, reaproveitada = self._obter_conexao()
+            try:
+                try:
+                    resposta = self._executar(conexao, caminho, headers)
+                except ERROS_CONEXAO_ENCERRADA:
+                    if not reaproveitada:
+                        raise
+                    # Servidor fechou a conexão ociosa: tentar uma vez com conexão nova
+                    conexao.close()
+                    conexao = self._criar_conexao()
+                    resposta = self._executar(conexao, caminho, headers)
+            except Exception:
+                conexao.close()
+                raise
+
+            status, headers_resposta, corpo, fechar = resposta
+            if fechar:
+                conexao.close()
+            else:
+                self._ociosas.put(conexao)
+
+        return status, headers_resposta, corpo
+
+    def _executar(self, conexao, caminho, headers):
+        """Envia a requisição e lê a resposta inteira (necessário para reusar a conexão)"""
+        conexao.request('GET', f"{self.prefixo}{caminho}", headers=headers)
+        resposta = conexao.getresponse()
+        corpo = resposta.read()
+
+        headers_resposta = {k.lower(): v for k, v in resposta.getheaders()}
+        if headers_resposta.get('content-encoding', '').lower() == 'gzip':
+            corpo = gzip.decompress(corpo)
+
+        return resposta.status, headers_resposta, corpo, resposta.will_close
+
+    def fechar(self):
+        """Fecha todas as conexões ociosas"""
+        while True:
+            try:
+                self._ociosas.get_nowait().close()
+            except Empty:
+                break
+
+
+class ClienteHTTPAsync:
+    """Pool de conexões HTTP(S) keep-alive não bloqueante (asyncio) para um único host"""
+
+    def __init__(self, url_base, tamanho_pool, timeout_conexao, timeout_leitura, ssl_context=None):
+        partes = urlsplit(url_base)
+        self.https = partes.scheme == 'https'
+        self.host = partes.hostname
+        self.porta = partes.port or (443 if self.https else 80)
+        self.prefixo = partes.path.rstrip('/')
+        self.tamanho_pool = tamanho_pool
+        self.timeout_conexao = timeout_conexao
+        self.timeout_leitura = timeout_leitura
+        self.ssl_context = ssl_context
+        self._ociosas = []
+        self._vagas = None  # criado no event loop em uso
+
+    async def _criar_conexao(self):
+        """Abre uma conexão nova respeitando o timeout de conexão"""
+        return await asyncio.wait_for(
+            asyncio.open_connection(
+                self.host,
+                self.porta,
+                ssl=self.ssl_context if self.https else None,
+                server_hostname=self.host if self.https else None
+            ),
+            self.timeout_conexao
+        )
+
+    async def get(self, caminho, headers=None):
+        """
+        Executa um GET e retorna (status, headers, corpo em bytes).
+        Exceções de rede (timeout, conexão recusada...) são propagadas.
+        """
+        if self._vagas is None:
+            self._vagas = asyncio.Semaphore(self.tamanho_pool)
+
+        headers = dict(headers or {})
+        headers.setdefault('Accept-Encoding', 'gzip')
+        headers.setdefault('Connection', 'keep-alive')
+
+        async with self._vagas:
+            reaproveitada = bool(self._ociosas)
+            conexao = self._ociosas.pop() if reaproveitada else await self._criar_conexao()
+            try:
+                try:
+                    resposta = await self._executar(conexao, caminho, headers)
+                except ERROS_CONEXAO_ENCERRADA + (asyncio.IncompleteReadError,):
+                    if not reaproveitada:
+                        raise
+                    # Servidor fechou a conexão ociosa: tentar uma vez com conexão nova
+                    conexao[1].close()
+                    conexao = await self._criar_conexao()
+                    resposta = await self._executar(conexao, caminho, headers)
+            except BaseException:
+                conexao[1].close()
+                raise
+
+            status, headers_resposta, corpo, fechar = resposta
+            if fechar:
+                conexao[1].close()
+            else:
+                self._ociosas.append(conexao)
+
+        return status, headers_resposta, corpo
+
+    async def _executar(self, conexao, caminho, headers):
+        """Envia a requisição HTTP/1.1 e lê a resposta inteira"""
+        leitor, escritor = conexao
+
+        linhas = [f"GET {self.prefixo}{caminho} HTTP/1.1", f"Host: {self.host}"]
+        linhas += [f"{nome}: {valor}" for nome, valor in headers.items()]
+        escritor.write(("\r\n".join(linhas) + "\r\n\r\n").encode('latin-1'))
+        await escritor.drain()
+
+        return await asyncio.wait_for(self._ler_resposta(leitor), self.timeout_leitura)
+
+    async def _ler_resposta(self, leitor):
+        """Lê status, headers e corpo (Content-Length, chunked ou até EOF)"""
+        linha_status = await leitor.readline()
+        if not linha_status:
+            raise http.client.RemoteDisconnected("Conexão encerrada pelo servidor")
+
+        partes = linha_status.decode('latin-1').split(None, 2)
+        if len(partes) < 2 or not partes[1].isdigit():
+            raise http.client.BadStatusLine(linha_status)
+        versao, status = partes[0], int(partes[1])
+
+        headers_resposta = {}
+        while True:
+            linha = await leitor.readline()
+            if linha in (b'\r\n', b'\n', b''):
+                break
+            nome, _, valor = linha.decode('latin-1').partition(':')
+            headers_resposta[nome.strip().lower()] = valor.strip()
+
+        fechar = (
+            headers_resposta.get('connection', '').lower() == 'close'
+            or versao == 'HTTP/1.0'
+        )
+
+        if headers_resposta.get('transfer-encoding', '').lower() == 'chunked':
+            blocos = []
+            while True:
+                tamanho = int((await leitor.readline()).split(b';')[0].strip(), 16)
+                if tamanho == 0:
+                    # Descartar trailers até a linha em branco
+                    while (await leitor.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                blocos.append(await leitor.readexactly(tamanho))
+                await leitor.readexactly(2)
+            corpo = b''.join(blocos)
+        elif 'content-length' in headers_resposta:
+            corpo = await leitor.readexactly(int(headers_resposta['content-length']))
+        else:
+            corpo = await leitor.read()
+            fechar = True
+
+        if headers_resposta.get('content-encoding', '').lower() == 'gzip':
+            corpo = gzip.decompress(corpo)
+
+        return status, headers_resposta, corpo, fechar
+
+    async def fechar(self):
+        """Fecha todas as conexões ociosas"""
+        while self._ociosas:
+            _, escritor = self._ociosas.pop()
+            escritor.close()
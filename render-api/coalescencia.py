@@ -0,0 +1,108 @@
+"""
+Coalescência de consultas simultâneas ao mesmo GTIN (single-flight)
+Quando vários usuários escaneiam o mesmo produto ao mesmo tempo, só a
+primeira requisição consulta a Cosmos; as outras aguardam o mesmo
+resultado em vez de gastar um crédito cada.
+
+- executar(): para o app Flask (threads)
+- executar_async(): para o modo asyncio (asgi.py)
+- estatisticas(): quantas consultas foram economizadas
+"""
+
+import asyncio
+import copy
+import threading
+
+
+class _Chamada:
+    """Consulta em andamento que outras requisições podem aguardar"""
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+
+class ColetorConsultas:
+    """Garante uma única consulta em andamento por chave (GTIN)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._em_andamento = {}
+        self._em_andamento_async = {}
+        self.consultas_executadas = 0
+        self.consultas_coalescidas = 0
+
+    def executar(self, chave, funcao):
+        """
+        Executa funcao() para a chave, ou aguarda a execução que já está em
+        andamento para a mesma chave e retorna o mesmo resultado.
+        """
+        with self._lock:
+            chamada = self._em_andamento.get(chave)
+            lider = chamada is None
+            if lider:
+                chamada = _Chamada()
+                self._em_andamento[chave] = chamada
+                self.consultas_executadas += 1
+            else:
+                self.consultas_coalescidas += 1
+
+        if not lider:
+            chamada.evento.wait()
+            if chamada.erro:
+                raise chamada.erro
+            # Cópia: cada requisição pode ajustar a própria resposta
+            return copy.deepcopy(chamada.resultado)
+
+        try:
+            chamada.resultado = funcao()
+            return chamada.resultado
+        except BaseException as e:
+            chamada.erro = e
+            raise
+        finally:
+            with self._lock:
+                del self._em_andamento[chave]
+            chamada.evento.set()
+
+    async def executar_async(self, chave, funcao_async):
+        """
+        Mesmo que executar(), para corrotinas (funcao_async é chamada sem argumentos).
+        A consulta roda numa tarefa própria: se a requisição que a iniciou for
+        cancelada (cliente desconectou), a consulta continua e as outras
+        requisições recebem o resultado normalmente.
+        """
+        tarefa = self._em_andamento_async.get(chave)
+        lider = tarefa is None
+        if lider:
+            tarefa = asyncio.ensure_future(funcao_async())
+            self._em_andamento_async[chave] = tarefa
+            tarefa.add_done_callback(lambda t: self._finalizar_async(chave, t))
+        with self._lock:
+            if lider:
+                self.consultas_executadas += 1
+            else:
+                self.consultas_coalescidas += 1
+
+        # shield: cancelar quem aguarda não cancela a consulta
+        resultado = await asyncio.shield(tarefa)
+        # Cópia: cada requisição pode ajustar a própria resposta
+        return resultado if lider else copy.deepcopy(resultado)
+
+    def _finalizar_async(self, chave, tarefa):
+        """Tira a consulta terminada do mapa de consultas em andamento"""
+        if self._em_andamento_async.get(chave) is tarefa:
+            del self._em_andamento_async[chave]
+        # Evita aviso "exception was never retrieved" quando ninguém aguardava
+        if not tarefa.cancelled():
+            tarefa.exception()
+
+    def estatisticas(self):
+        """Resumo para monitoramento"""
+        with self._lock:
+            return {
+                "consultas_cosmos": self.consultas_executadas,
+                "consultas_coalescidas": self.consultas_coalescidas,
+                "em_andamento": len(self._em_andamento) + len(self._em_andamento_async)
+            }
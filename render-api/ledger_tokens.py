@@ -0,0 +1,117 @@
+"""
+Registro (ledger) de uso diário dos tokens Bluesoft em SQLite
+Todos os workers do gunicorn (e reinícios do processo) enxergam o mesmo
+contador, então o limite de 25 consultas/dia por token não é ultrapassado
+ao escalar horizontalmente nem zerado num cold start do Render.
+
+- Um contador por (dia, token); a virada do dia zera o uso naturalmente
+- Reserva atômica (BEGIN IMMEDIATE): dois workers nunca pegam a mesma vaga
+- Os tokens são gravados como hash (o arquivo não guarda segredos)
+"""
+
+import hashlib
+import threading
+from datetime import date
+
+from banco_sqlite import ConexaoSQLite
+
+
+class LedgerTokens:
+    """Contador de uso diário por token, compartilhado entre processos"""
+
+    def __init__(self, caminho, limite_diario):
+        self.caminho = caminho
+        self.limite_diario = limite_diario
+        self._lock = threading.Lock()
+        # isolation_level=None: transações controladas manualmente (BEGIN IMMEDIATE)
+        self._banco = ConexaoSQLite(caminho, self._criar_tabela, timeout=10, isolation_level=None)
+        self._ultimo_dia_limpo = None
+
+    @staticmethod
+    def _criar_tabela(conexao):
+        """Uso por (dia, token)"""
+        conexao.execute("""
+            CREATE TABLE IF NOT EXISTS uso_tokens (
+                dia TEXT NOT NULL,
+                token TEXT NOT NULL,
+                usado INTEGER NOT NULL,
+                PRIMARY KEY (dia, token)
+            )
+        """)
+
+    @staticmethod
+    def _chave(token):
+        """Identificador do token no arquivo (hash, nunca o token em si)"""
+        return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+    @staticmethod
+    def dia_atual():
+        return date.today().isoformat()
+
+    def _limpar_dias_antigos(self, conexao, dia):
+        """Remove contadores de dias anteriores (uma vez por dia por processo)"""
+        if self._ultimo_dia_limpo != dia:
+            conexao.execute("DELETE FROM uso_tokens WHERE dia < ?", (dia,))
+            self._ultimo_dia_limpo = dia
+
+    def reservar(self, tokens):
+        """
+        Reserva uma consulta no primeiro token com saldo, em ordem.
+        Retorna (token, uso após a reserva) ou (None, None) se todos esgotaram.
+        """
+        dia = self.dia_atual()
+        with self._lock:
+            conexao = self._banco.conectar()
+            conexao.execute("BEGIN IMMEDIATE")
+            try:
+                self._limpar_dias_antigos(conexao, dia)
+                for token in tokens:
+                    chave = self._chave(token)
+                    linha = conexao.execute(
+                        "SELECT usado FROM uso_tokens WHERE dia = ? AND token = ?",
+                        (dia, chave)
+                    ).fetchone()
+                    usado = linha[0] if linha else 0
+
+                    if usado < self.limite_diario:
+                        conexao.execute(
+                            "INSERT INTO uso_tokens (dia, token, usado) VALUES (?, ?, 1) "
+                            "ON CONFLICT (dia, token) DO UPDATE SET usado = usado + 1",
+                            (dia, chave)
+                        )
+                        conexao.execute("COMMIT")
+                        return token, usado + 1
+
+                conexao.execute("COMMIT")
+                return None, None
+            except BaseException:
+                conexao.execute("ROLLBACK")
+                raise
+
+    def liberar(self, token):
+        """Devolve uma reserva que não foi cobrada pela Cosmos"""
+        with self._lock:
+            self._banco.conectar().execute(
+                "UPDATE uso_tokens SET usado = MAX(usado - 1, 0) WHERE dia = ? AND token = ?",
+                (self.dia_atual(), self._chave(token))
+            )
+
+    def esgotar(self, token):
+        """Marca o token como esgotado hoje (Cosmos respondeu 429)"""
+        with self._lock:
+            self._banco.conectar().execute(
+                "INSERT INTO uso_tokens (dia, token, usado) VALUES (?, ?, ?) "
+                "ON CONFLICT (dia, token) DO UPDATE SET usado = MAX(usado, excluded.usado)",
+                (self.dia_atual(), self._chave(token), self.limite_diario)
+            )
+
+    def uso(self, tokens):
+        """Retorna {token: consultas usadas hoje}"""
+        with self._lock:
+            linhas = self._banco.conectar().execute(
+                "SELECT token, usado FROM uso_tokens WHERE dia = ?",
+                (self.dia_atual(),)
+            ).fetchall()
+
+        por_chave = dict(linhas)
+        return {token: por_chave.get(self._chave(token), 0) for token in tokens}
@@ -0,0 +1,178 @@
+"""
+Métricas no formato texto do Prometheus (GET /metrics), sem dependências
+Contadores, medidores (gauges) e histogramas com rótulos, seguros para
+várias threads. Valores que já existem em outro lugar (uso dos tokens no
+ledger, itens em cache) são lidos na hora da exportação por coletores.
+
+Cada processo tem o próprio registro: com vários workers do gunicorn,
+cada scrape enxerga só o worker que respondeu (o uso dos tokens vem do
+ledger e é sempre o total).
+
+percentil() é o mesmo cálculo usado pelos benchmarks e pelo relatório do
+processar.py.
+"""
+
+import math
+import threading
+
+TIPO_CONTEUDO = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Faixas (segundos) adequadas tanto para o cache (ms) quanto para a Cosmos (s)
+FAIXAS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def percentil(valores, p):
+    """Percentil pelo método nearest-rank (valores já ordenados; 0.0 se vazio)"""
+    if not valores:
+        return 0.0
+    # Posição ceil(p% de n), contando de 1
+    indice = max(0, min(len(valores) - 1, math.ceil(p / 100 * len(valores)) - 1))
+    return valores[indice]
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatar_rotulos(nomes, valores, extra=None):
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _formatar_numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) and not valor.is_integer() else str(int(valor))
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._lock = threading.Lock()
+        self._valores = {}
+
+    def _chave(self, rotulos):
+        return tuple(str(rotulos.get(n, '')) for n in self.rotulos)
+
+    def exportar(self):
+        linhas = [f'# HELP {self.nome} {self.ajuda}', f'# TYPE {self.nome} {self.tipo}']
+        with self._lock:
+            itens = sorted(self._valores.items())
+        for chave, valor in itens:
+            linhas.append(f'{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(valor)}')
+        return linhas
+
+
+class Contador(_Metrica):
+    """Valor que só cresce (requisições, erros...)"""
+
+    tipo = 'counter'
+
+    def inc(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def definir(self, valor, **rotulos):
+        """Para contadores mantidos em outro lugar (copiados por um coletor)"""
+        with self._lock:
+            self._valores[self._chave(rotulos)] = valor
+
+
+class Medidor(_Metrica):
+    """Valor que sobe e desce (requisições em andamento, itens em cache...)"""
+
+    tipo = 'gauge'
+
+    def definir(self, valor, **rotulos):
+        with self._lock:
+            self._valores[self._chave(rotulos)] = valor
+
+    def inc(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def dec(self, valor=1, **rotulos):
+        self.inc(-valor, **rotulos)
+
+
+class Histograma(_Metrica):
+    """Distribuição de durações em faixas cumulativas (…_bucket, _sum, _count)"""
+
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, rotulos=(), faixas=FAIXAS_PADRAO):
+        super().__init__(nome, ajuda, rotulos)
+        self.faixas = tuple(sorted(faixas))
+
+    def observar(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            contagens, soma, total = self._valores.get(chave, ([0] * len(self.faixas), 0.0, 0))
+            for i, limite in enumerate(self.faixas):
+                if valor <= limite:
+                    contagens[i] += 1
+                    break
+            # Acima da maior faixa só entra no total (faixa +Inf)
+            self._valores[chave] = (contagens, soma + valor, total + 1)
+
+    def exportar(self):
+        linhas = [f'# HELP {self.nome} {self.ajuda}', f'# TYPE {self.nome} {self.tipo}']
+        with self._lock:
+            itens = sorted((k, (list(c), s, t)) for k, (c, s, t) in self._valores.items())
+        for chave, (contagens, soma, total) in itens:
+            acumulado = 0
+            for limite, quantidade in zip(self.faixas, contagens):
+                acumulado += quantidade
+                rotulos = _formatar_rotulos(self.rotulos, chave, f'le="{_formatar_numero(limite)}"')
+                linhas.append(f'{self.nome}_bucket{rotulos} {acumulado}')
+            rotulos = _formatar_rotulos(self.rotulos, chave, 'le="+Inf"')
+            linhas.append(f'{self.nome}_bucket{rotulos} {total}')
+            linhas.append(f'{self.nome}_sum{_formatar_rotulos(self.rotulos, chave)} {soma!r}')
+            linhas.append(f'{self.nome}_count{_formatar_rotulos(self.rotulos, chave)} {total}')
+        return linhas
+
+
+class Registro:
+    """Conjunto de métricas exportadas juntas em /metrics"""
+
+    def __init__(self):
+        self._metricas = []
+        self._coletores = []
+
+    def _adicionar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._adicionar(Contador(nome, ajuda, rotulos))
+
+    def medidor(self, nome, ajuda, rotulos=()):
+        return self._adicionar(Medidor(nome, ajuda, rotulos))
+
+    def histograma(self, nome, ajuda, rotulos=(), faixas=FAIXAS_PADRAO):
+        return self._adicionar(Histograma(nome, ajuda, rotulos, faixas))
+
+    def coletor(self, funcao):
+        """Registra funcao() para atualizar medidores logo antes de cada exportação"""
+        self._coletores.append(funcao)
+        return funcao
+
+    def exportar(self):
+        for coletor in self._coletores:
+            try:
+                coletor()
+            except Exception as e:
+                print(f"⚠️  Erro ao coletar métricas: {e}")
+
+        linhas = []
+        for metrica in self._metricas:
+            linhas.extend(metrica.exportar())
+        return '\n'.join(linhas) + '\n'
@@ -0,0 +1,178 @@
+"""
+Índice de prefixos de empresa GS1 (SQLite) para inferir marca/fabricante
+Cada produto encontrado na Cosmos revela a marca e o fabricante do prefixo
+de empresa do GTIN (os 7 a 9 primeiros dígitos de um EAN-13 brasileiro,
+789/790). O índice guarda essa observação por GTIN e responde com o prefixo
+mais longo que tenha evidência suficiente, para completar respostas de GTINs
+que a Cosmos não conhece (404) ou que não dá para consultar (cota esgotada).
+
+- Aprendizado incremental: uma linha por GTIN (consultas repetidas não
+  inflam a contagem; uma marca corrigida substitui a anterior)
+- Na primeira vez, é povoado com os produtos que já estão no cache
+- Busca por faixa na chave primária (gtin >= prefixo AND gtin < prefixo + 1)
+- Só infere quando a marca mais vista no prefixo tem confiança mínima
+"""
+
+import sqlite3
+import threading
+import time
+
+from banco_sqlite import ConexaoSQLite
+
+# Prefixos GS1 Brasil; a empresa ocupa de 7 a 9 dígitos do EAN-13
+PREFIXOS_PAIS = ('789', '790')
+TAMANHOS_PREFIXO = (9, 8, 7)
+
+
+def gtin13_brasileiro(canonico):
+    """EAN-13 do GTIN canônico (14 dígitos) se for brasileiro, senão None"""
+    if canonico and canonico[0] == '0' and canonico[1:4] in PREFIXOS_PAIS:
+        return canonico[1:]
+    return None
+
+
+class IndicePrefixosGS1:
+    """Observações (GTIN → marca/fabricante) consultadas por prefixo mais longo"""
+
+    def __init__(self, caminho, confianca_minima=0.6, min_observacoes=3):
+        self.caminho = caminho
+        self.confianca_minima = confianca_minima
+        # Pelo menos uma observação: sem linhas não há marca para inferir
+        self.min_observacoes = max(1, min_observacoes)
+        self._lock = threading.Lock()
+        # isolation_level=None: transações controladas manualmente (BEGIN IMMEDIATE)
+        self._banco = ConexaoSQLite(caminho, self._criar_tabela, isolation_level=None)
+
+    @staticmethod
+    def _criar_tabela(conexao):
+        """Marca/fabricante observados por GTIN"""
+        conexao.execute("""
+            CREATE TABLE IF NOT EXISTS marcas_por_gtin (
+                gtin TEXT PRIMARY KEY,
+                marca TEXT,
+                fabricante TEXT,
+                atualizado_em REAL NOT NULL
+            )
+        """)
+
+    @staticmethod
+    def _observacao(canonico, resposta):
+        """(gtin13, marca, fabricante) de uma resposta encontrada, ou None"""
+        gtin13 = gtin13_brasileiro(canonico)
+        if not gtin13 or not resposta or not resposta.get('encontrado'):
+            return None
+        marca = resposta.get('marca')
+        fabricante = resposta.get('fabricante')
+        if not marca and not fabricante:
+            return None
+        return gtin13, marca, fabricante
+
+    def aprender(self, canonico, resposta):
+        """Registra a marca/fabricante de um produto encontrado"""
+        observacao = self._observacao(canonico, resposta)
+        if not observacao:
+            return
+        try:
+            with self._lock:
+                self._banco.conectar().execute(
+                    "INSERT OR REPLACE INTO marcas_por_gtin (gtin, marca, fabricante, atualizado_em) "
+                    "VALUES (?, ?, ?, ?)",
+                    (*observacao, time.time())
+                )
+        except sqlite3.Error as e:
+            # O índice é só um complemento: nunca derruba a consulta
+            print(f"⚠️  Erro ao gravar prefixo GS1 ({canonico}): {e}")
+
+    def povoar_se_vazio(self, itens):
+        """
+        Aprende de uma vez os itens (canonico, resposta) — ex.: o cache de
+        produtos — se o índice ainda estiver vazio. Vários workers podem
+        chamar ao mesmo tempo: só o primeiro povoa. Retorna quantos aprendeu.
+        """
+        agora = time.time()
+        try:
+            with self._lock:
+                conexao = self._banco.conectar()
+                conexao.execute("BEGIN IMMEDIATE")
+                try:
+                    if conexao.execute("SELECT 1 FROM marcas_por_gtin LIMIT 1").fetchone():
+                        conexao.execute("COMMIT")
+                        return 0
+                    observacoes = [
+                        (*observacao, agora)
+                        for observacao in (self._observacao(c, r) for c, r in itens)
+                        if observacao
+                    ]
+                    conexao.executemany(
+                        "INSERT OR REPLACE INTO marcas_por_gtin (gtin, marca, fabricante, atualizado_em) "
+                        "VALUES (?, ?, ?, ?)",
+                        observacoes
+                    )
+                    conexao.execute("COMMIT")
+                except BaseException:
+                    conexao.execute("ROLLBACK")
+                    raise
+            return len(observacoes)
+
+        except sqlite3.Error as e:
+            print(f"⚠️  Erro ao povoar índice de prefixos GS1: {e}")
+            return 0
+
+    def inferir(self, canonico):
+        """
+        Marca/fabricante mais provável pelo prefixo mais longo com evidência.
+        Retorna {marca, fabricante, prefixo, observacoes, confianca} ou None.
+        """
+        gtin13 = gtin13_brasileiro(canonico)
+        if not gtin13:
+            return None
+
+        try:
+            with self._lock:
+                conexao = self._banco.conectar()
+                for tamanho in TAMANHOS_PREFIXO:
+                    prefixo = gtin13[:tamanho]
+                    # Faixa [prefixo, prefixo + 1): usa a chave primária, sem LIKE
+                    fim = str(int(prefixo) + 1).zfill(tamanho)
+                    linhas = conexao.execute(
+                        "SELECT marca, fabricante, COUNT(*) AS n FROM marcas_por_gtin "
+                        "WHERE gtin >= ? AND gtin < ? AND gtin != ? "
+                        "GROUP BY marca, fabricante ORDER BY n DESC",
+                        (prefixo, fim, gtin13)
+                    ).fetchall()
+
+                    total = sum(n for _, _, n in linhas)
+                    if total < self.min_observacoes:
+                        continue
+
+                    marca, fabricante, n = linhas[0]
+                    confianca = n / total
+                    if confianca >= self.confianca_minima:
+                        return {
+                            "marca": marca,
+                            "fabricante": fabricante,
+                            "prefixo": prefixo,
+                            "observacoes": total,
+                            "confianca": round(confianca, 2)
+                        }
+
+        except sqlite3.Error as e:
+            print(f"⚠️  Erro ao consultar prefixo GS1 ({canonico}): {e}")
+
+        return None
+
+    def estatisticas(self):
+        """Resumo do índice para monitoramento"""
+        try:
+            with self._lock:
+                gtins, prefixos = self._banco.conectar().execute(
+                    "SELECT COUNT(*), COUNT(DISTINCT substr(gtin, 1, 7)) FROM marcas_por_gtin"
+                ).fetchone()
+        except sqlite3.Error:
+            gtins, prefixos = None, None
+
+        return {
+            "gtins_observados": gtins,
+            "prefixos_7_digitos": prefixos,
+            "confianca_minima": self.confianca_minima
+        }
@@ -0,0 +1,233 @@
+"""
+Cabeçalhos de cache HTTP e compressão das respostas de produto
+Usado por GET /api/produtos/{gtin} no app.py (Flask) e no asgi.py.
+
+- ETag forte calculado do registro normalizado (JSON com chaves ordenadas,
+  sem o campo "origem", que só diz de onde veio esta resposta)
+- If-None-Match → 304 sem corpo
+- Cache-Control com max-age/stale-while-revalidate próprios para
+  produto encontrado e não encontrado; erros não são guardados (no-store)
+- Compressão br (se o pacote brotli estiver instalado) ou gzip, negociada
+  pelo Accept-Encoding; cada codificação tem seu ETag (sufixo -br/-gzip)
+- Respostas prontas: bytes já serializados, ETag e variantes comprimidas
+  guardados em memória por GTIN canônico — um acerto é só busca + envio,
+  sem montar dicionário, serializar JSON ou comprimir
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # br é opcional: sem o pacote, só gzip
+    brotli = None
+
+CODIFICACOES = ('br', 'gzip') if brotli else ('gzip',)
+
+# Campos que não fazem parte do registro do produto (não mudam o ETag)
+CAMPOS_VOLATEIS = ('origem',)
+
+
+def serializar(corpo):
+    """JSON no mesmo formato do jsonify do Flask (compacto, chaves ordenadas)"""
+    return (json.dumps(corpo, ensure_ascii=True, sort_keys=True, separators=(',', ':')) + '\n').encode()
+
+
+def calcular_etag(corpo):
+    """ETag forte do registro normalizado (sem os campos voláteis)"""
+    registro = {k: v for k, v in corpo.items() if k not in CAMPOS_VOLATEIS}
+    return '"' + hashlib.sha256(serializar(registro)).hexdigest()[:32] + '"'
+
+
+def etag_da_codificacao(etag, codificacao):
+    """ETag da variante comprimida: "abc" → "abc-gzip" """
+    return f'{etag[:-1]}-{codificacao}"' if codificacao else etag
+
+
+def etag_corresponde(if_none_match, etag):
+    """
+    Compara If-None-Match com o ETag (comparação fraca, como pede o RFC 9110),
+    aceitando qualquer variante de codificação do mesmo registro.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+
+    base = etag.strip('"')
+    for candidato in if_none_match.split(','):
+        candidato = candidato.strip()
+        if candidato.startswith('W/'):
+            candidato = candidato[2:]
+        candidato = candidato.strip('"')
+        for codificacao in CODIFICACOES:
+            if candidato.endswith(f'-{codificacao}'):
+                candidato = candidato[:-len(codificacao) - 1]
+        if candidato == base:
+            return True
+    return False
+
+
+def escolher_codificacao(accept_encoding):
+    """Melhor codificação aceita pelo cliente (br > gzip), ou None"""
+    if not accept_encoding:
+        return None
+
+    aceitas = {}
+    for item in accept_encoding.split(','):
+        partes = [p.strip() for p in item.split(';')]
+        nome = partes[0].lower()
+        peso = 1.0
+        for parametro in partes[1:]:
+            if parametro.startswith('q='):
+                try:
+                    peso = float(parametro[2:])
+                except ValueError:
+                    peso = 0.0
+        aceitas[nome] = peso
+
+    candidatas = [
+        c for c in CODIFICACOES
+        if aceitas.get(c, aceitas.get('*', 0.0)) > 0
+    ]
+    if not candidatas:
+        return None
+    return max(candidatas, key=lambda c: aceitas.get(c, aceitas.get('*', 0.0)))
+
+
+def comprimir(conteudo, codificacao):
+    """Comprime o corpo; gzip com mtime=0 para os bytes (e o ETag) não variarem"""
+    if codificacao == 'br':
+        return brotli.compress(conteudo, quality=5)
+    return gzip.compress(conteudo, compresslevel=6, mtime=0)
+
+
+class RespostaPronta:
+    """Resposta já serializada: corpo em bytes, ETag e variantes comprimidas"""
+
+    __slots__ = ('status_http', 'etag', 'cache_control', 'variantes')
+
+    def __init__(self, status_http, conteudo, etag, cache_control):
+        self.status_http = status_http
+        self.etag = etag
+        self.cache_control = cache_control
+        self.variantes = {None: conteudo}
+
+    def variante(self, codificacao):
+        """Corpo na codificação pedida (comprime na primeira vez e guarda)"""
+        conteudo = self.variantes.get(codificacao)
+        if conteudo is None:
+            conteudo = comprimir(self.variantes[None], codificacao)
+            self.variantes[codificacao] = conteudo
+        return conteudo
+
+    def precomprimir(self):
+        """Calcula todas as variantes de uma vez (antes de guardar no cache)"""
+        for codificacao in CODIFICACOES:
+            self.variante(codificacao)
+        return self
+
+    def enviar(self, accept_encoding=None, if_none_match=None, compressao_min_bytes=0):
+        """
+        Retorna (status HTTP, corpo em bytes, cabeçalhos) prontos para envio.
+        Com If-None-Match igual ao ETag atual, responde 304 sem corpo.
+        """
+        headers = {
+            'Content-Type': 'application/json',
+            'Cache-Control': self.cache_control,
+            'Vary': 'Accept-Encoding',
+        }
+
+        codificacao = None
+        if len(self.variantes[None]) >= compressao_min_bytes:
+            codificacao = escolher_codificacao(accept_encoding)
+
+        if self.etag:
+            headers['ETag'] = etag_da_codificacao(self.etag, codificacao)
+            if etag_corresponde(if_none_match, self.etag):
+                del headers['Content-Type']
+                return 304, b'', headers
+
+        if codificacao:
+            headers['Content-Encoding'] = codificacao
+        return self.status_http, self.variante(codificacao), headers
+
+
+class CacheRespostasProntas:
+    """LRU em memória (por processo) de respostas prontas, por GTIN canônico"""
+
+    def __init__(self, max_itens, ttl_segundos):
+        self.max_itens = max_itens
+        self.ttl_segundos = ttl_segundos
+        self._lock = threading.Lock()
+        self._itens = OrderedDict()
+
+    def obter(self, canonico):
+        """Resposta pronta do GTIN, ou None se ausente/expirada"""
+        with self._lock:
+            item = self._itens.get(canonico)
+            if item is None:
+                return None
+            pronta, expira_em = item
+            if time.monotonic() > expira_em:
+                del self._itens[canonico]
+                return None
+            self._itens.move_to_end(canonico)
+            return pronta
+
+    def salvar(self, canonico, pronta):
+        """Guarda a resposta e remove a menos usada quando passa de max_itens"""
+        if self.max_itens <= 0:
+            return
+        with self._lock:
+            self._itens[canonico] = (pronta, time.monotonic() + self.ttl_segundos)
+            self._itens.move_to_end(canonico)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def estatisticas(self):
+        """Resumo do cache para monitoramento"""
+        with self._lock:
+            total = len(self._itens)
+        return {
+            "itens": total,
+            "max_itens": self.max_itens,
+            "ttl_segundos": self.ttl_segundos
+        }
+
+
+class RespostasHTTP:
+    """Monta status, corpo e cabeçalhos HTTP de uma resposta de produto"""
+
+    def __init__(self, max_age_encontrado, swr_encontrado,
+                 max_age_nao_encontrado, swr_nao_encontrado, compressao_min_bytes):
+        self.max_age_encontrado = max_age_encontrado
+        self.swr_encontrado = swr_encontrado
+        self.max_age_nao_encontrado = max_age_nao_encontrado
+        self.swr_nao_encontrado = swr_nao_encontrado
+        self.compressao_min_bytes = compressao_min_bytes
+
+    def cache_control(self, corpo, status_http):
+        """Cache-Control conforme o resultado (só 200 pode ser guardado)"""
+        if status_http != 200:
+            return 'no-store'
+        if corpo.get('encontrado'):
+            return f'public, max-age={self.max_age_encontrado}, stale-while-revalidate={self.swr_encontrado}'
+        return f'public, max-age={self.max_age_nao_encontrado}, stale-while-revalidate={self.swr_nao_encontrado}'
+
+    def preparar(self, corpo, status_http):
+        """Serializa o corpo uma vez e calcula o ETag (só para 200)"""
+        return RespostaPronta(
+            status_http,
+            serializar(corpo),
+            calcular_etag(corpo) if status_http == 200 else None,
+            self.cache_control(corpo, status_http)
+        )
+
+    def enviar(self, pronta, accept_encoding=None, if_none_match=None):
+        """(status HTTP, corpo em bytes, cabeçalhos) de uma resposta pronta"""
+        return pronta.enviar(accept_encoding, if_none_match, self.compressao_min_bytes)
@@ -0,0 +1,58 @@
+"""
+Normalização e validação de GTIN (padrão GS1)
+Compartilhado pela API (app.py) e pelo processamento automático
+(scripts/processamento-automatico/processar.py).
+
+- Aceita GTIN-8, GTIN-12 (UPC-A), GTIN-13 (EAN-13) e GTIN-14
+- Confere o dígito verificador antes de qualquer consulta à Cosmos
+  (um código digitado errado não gasta crédito)
+- Forma canônica: 14 dígitos com zeros à esquerda, usada como chave de
+  cache — "7891910000197" e "07891910000197" são o mesmo produto
+"""
+
+TAMANHOS_VALIDOS = (8, 12, 13, 14)
+
+
+def digito_verificador(digitos):
+    """Calcula o dígito verificador GS1 para os dígitos sem o verificador"""
+    # Pesos 3,1,3,1... a partir do dígito mais à direita
+    soma = sum(
+        int(d) * (3 if i % 2 == 0 else 1)
+        for i, d in enumerate(reversed(digitos))
+    )
+    return (10 - soma % 10) % 10
+
+
+def normalizar_gtin(gtin):
+    """
+    Valida o GTIN e retorna (forma canônica de 14 dígitos, None),
+    ou (None, mensagem de erro) se for inválido.
+    """
+    if gtin is None or not str(gtin).strip():
+        return None, "GTIN não fornecido"
+
+    gtin = str(gtin).strip()
+
+    if not (gtin.isascii() and gtin.isdigit()):
+        return None, "GTIN deve conter apenas números"
+
+    if len(gtin) not in TAMANHOS_VALIDOS:
+        return None, f"GTIN deve ter 8, 12, 13 ou 14 dígitos (recebido: {len(gtin)})"
+
+    esperado = digito_verificador(gtin[:-1])
+    if int(gtin[-1]) != esperado:
+        return None, f"Dígito verificador inválido (esperado: {esperado}, recebido: {gtin[-1]})"
+
+    return gtin.zfill(14), None
+
+
+def gtin_para_consulta(canonico):
+    """
+    Converte a forma canônica (14 dígitos) no código enviado à Cosmos:
+    GTIN-8 volta a ter 8 dígitos; GTIN-12/13 viram EAN-13; GTIN-14 fica igual.
+    """
+    if canonico.startswith('000000'):
+        return canonico[6:]
+    if canonico.startswith('0'):
+        return canonico[1:]
+    return canonico
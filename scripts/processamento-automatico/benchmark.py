@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+📏 BENCHMARK DO PROCESSAMENTO AUTOMÁTICO - CICLIK
+=================================================
+
+Roda o processar.py de verdade contra servidores falsos locais (Supabase,
+Render/Cosmos — ver servidores_falsos.py) e mede produtos/s, latência
+p50/p95 por etapa e créditos gastos. Serve para comparar ajustes de
+concorrência e de lotes antes de levá-los para produção.
+
+Uso:
+    python benchmark.py --produtos 300 --concorrencia 8 --latencia-render 300
+    python benchmark.py --cold-start 20 --taxa-404 0.3 --json resultado.json
+
+Cada execução mede uma configuração; para comparar, rode com parâmetros
+diferentes e compare os JSONs.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from servidores_falsos import PostgRESTFalso, RenderFalso
+# render-api/ entra no sys.path pelo servidores_falsos
+from validacao_gtin import digito_verificador
+
+
+# ==================== DADOS SINTÉTICOS ====================
+
+def gerar_gtin(aleatorio):
+    """EAN-13 válido com prefixo brasileiro (789)"""
+    corpo = '789' + ''.join(str(aleatorio.randint(0, 9)) for _ in range(9))
+    return corpo + str(digito_verificador(corpo))
+
+
+def gerar_produtos(quantidade, taxa_duplicados, taxa_invalidos, seed):
+    """Linhas pendentes de produtos_em_analise com GTINs repetidos e inválidos"""
+    aleatorio = random.Random(seed)
+    inicio = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    gtins = []
+    produtos = []
+
+    for i in range(quantidade):
+        sorteio = aleatorio.random()
+        if gtins and sorteio < taxa_duplicados:
+            gtin = aleatorio.choice(gtins)
+        elif sorteio < taxa_duplicados + taxa_invalidos:
+            valido = gerar_gtin(aleatorio)
+            gtin = valido[:-1] + str((int(valido[-1]) + 1) % 10)
+        else:
+            gtin = gerar_gtin(aleatorio)
+            gtins.append(gtin)
+
+        criado = (inicio + timedelta(minutes=i)).isoformat()
+        produtos.append({
+            'id': f'00000000-0000-4000-8000-{i:012d}',
+            'ean_gtin': gtin,
+            'descricao': f'Produto escaneado {i}',
+            'status': 'pendente',
+            'created_at': criado,
+            'data_primeira_deteccao': criado,
+            'quantidade_ocorrencias': aleatorio.randint(1, 5),
+            'consultado_em': None
+        })
+
+    return produtos
+
+
+# ==================== EXECUÇÃO ====================
+
+def executar(args):
+    """Sobe os servidores falsos, roda processar.main() e devolve o resultado"""
+    supabase = PostgRESTFalso(
+        latencia_leitura=args.latencia_supabase / 1000,
+        latencia_escrita=args.latencia_supabase / 1000,
+        seed=args.seed
+    ).iniciar()
+    render = RenderFalso(
+        latencia=args.latencia_render / 1000,
+        taxa_404=args.taxa_404,
+        taxa_429=args.taxa_429,
+        cold_start=args.cold_start,
+        limite_token=args.creditos // 4,
+        seed=args.seed
+    ).iniciar()
+
+    supabase.semear(gerar_produtos(args.produtos, args.duplicados, args.invalidos, args.seed))
+
+    pasta = tempfile.mkdtemp(prefix='benchmark-ciclik-')
+    os.environ.update({
+        'SUPABASE_URL': supabase.url,
+        'SUPABASE_SERVICE_KEY': 'benchmark',
+        'API_RENDER_URL': render.url,
+        'API_RENDER_TOKEN': 'benchmark',
+        'LIMITE_PRODUTOS': str(args.produtos),
+        'CONCORRENCIA': str(args.concorrencia),
+        'TAMANHO_LOTE_CONSULTA': str(args.lote_consulta),
+        'TAMANHO_LOTE_ESCRITA': str(args.lote_escrita),
+        'TAMANHO_LOTE_LOG': str(args.lote_log),
+        'DIARIO_CONSULTAS': os.path.join(pasta, 'consultas.jsonl'),
+        'RELATORIO_JSON': os.path.join(pasta, 'relatorio-processamento.json'),
+        'MODO_TESTE': 'false'
+    })
+    if args.prioridade is not None:
+        os.environ['PRIORIDADE'] = args.prioridade
+
+    # Importado só agora: o processar.py lê a configuração na importação
+    import processar
+
+    saida = io.StringIO()
+    codigo_saida = 0
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stdout if args.verboso else saida):
+        try:
+            processar.main()
+        except SystemExit as e:
+            codigo_saida = e.code or 0
+    duracao = time.perf_counter() - inicio
+
+    gravados = supabase.gravados()
+    supabase.parar()
+    render.parar()
+
+    return {
+        'configuracao': {
+            'produtos': args.produtos,
+            'duplicados': args.duplicados,
+            'invalidos': args.invalidos,
+            'concorrencia': args.concorrencia,
+            'lote_consulta': args.lote_consulta,
+            'lote_escrita': args.lote_escrita,
+            'lote_log': args.lote_log,
+            'latencia_render_ms': args.latencia_render,
+            'latencia_supabase_ms': args.latencia_supabase,
+            'taxa_404': args.taxa_404,
+            'taxa_429': args.taxa_429,
+            'cold_start_s': args.cold_start,
+            'creditos': args.creditos,
+            'prioridade': os.environ.get('PRIORIDADE', processar.PRIORIDADE),
+            'seed': args.seed
+        },
+        'resultado': {
+            'codigo_saida': codigo_saida,
+            'duracao_s': round(duracao, 3),
+            'produtos_gravados': gravados,
+            'produtos_por_segundo': round(gravados / duracao, 2) if duracao else 0,
+            'creditos_gastos': render.creditos_gastos,
+            'acertos_cache_api': render.acertos_cache,
+            'logs_gravados': len(supabase.logs),
+            'requisicoes_supabase': dict(sorted(supabase.pedidos.items())),
+            'requisicoes_render': dict(sorted(render.pedidos.items()))
+        },
+        # Mesmo tempo por etapa do relatório do processar.py (CronometroEtapas)
+        'etapas': processar.cronometro.resumo()
+    }
+
+
+def imprimir(resultado):
+    """Resumo legível no console"""
+    r = resultado['resultado']
+    print("=" * 60)
+    print("📏 BENCHMARK - PROCESSAMENTO AUTOMÁTICO")
+    print("=" * 60)
+    print(f"⏱️ Duração: {r['duracao_s']:.2f}s (exit {r['codigo_saida']})")
+    print(f"📦 Produtos gravados: {r['produtos_gravados']} ({r['produtos_por_segundo']:.1f}/s)")
+    print(f"💳 Créditos gastos: {r['creditos_gastos']}")
+    print(f"📝 Logs gravados: {r['logs_gravados']}")
+    print("\n📊 Latência por etapa (ms):")
+    print(f"  {'etapa':<22}{'chamadas':>9}{'p50':>9}{'p95':>9}{'max':>9}")
+    for etapa, e in resultado['etapas'].items():
+        print(f"  {etapa:<22}{e['chamadas']:>9}{e['p50_ms']:>9.1f}{e['p95_ms']:>9.1f}{e['max_ms']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do processar.py com servidores falsos')
+    parser.add_argument('--produtos', type=int, default=200, help='Linhas pendentes geradas')
+    parser.add_argument('--duplicados', type=float, default=0.2, help='Fração de linhas com GTIN repetido')
+    parser.add_argument('--invalidos', type=float, default=0.02, help='Fração de GTINs com dígito errado')
+    parser.add_argument('--concorrencia', type=int, default=4)
+    parser.add_argument('--lote-consulta', type=int, default=10, help='GTINs por POST /api/produtos/lote')
+    parser.add_argument('--lote-escrita', type=int, default=25)
+    parser.add_argument('--lote-log', type=int, default=50)
+    parser.add_argument('--latencia-render', type=float, default=300, help='ms por consulta à Cosmos')
+    parser.add_argument('--latencia-supabase', type=float, default=30, help='ms por requisição')
+    parser.add_argument('--taxa-404', type=float, default=0.2)
+    parser.add_argument('--taxa-429', type=float, default=0.0, help='Chance de um token ser recusado')
+    parser.add_argument('--cold-start', type=float, default=0.0, help='Segundos até a API acordar')
+    parser.add_argument('--creditos', type=int, default=100, help='Créditos do dia (4 tokens)')
+    parser.add_argument('--prioridade', default=None, help='PRIORIDADE repassada ao processar.py')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', dest='arquivo_json', help='Grava o resultado neste arquivo')
+    parser.add_argument('--verboso', action='store_true', help='Mostra o log do processar.py')
+    args = parser.parse_args()
+
+    resultado = executar(args)
+    imprimir(resultado)
+
+    if args.arquivo_json:
+        with open(args.arquivo_json, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+        print(f"\n💾 Resultado salvo em {args.arquivo_json}")
+
+
+if __name__ == '__main__':
+    main()
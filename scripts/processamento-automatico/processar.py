@@ -7,11 +7,12 @@ Script executado pelo GitHub Actions para processar produtos pendentes
 automaticamente na madrugada, aproveitando os 100 créditos diários da API Bluesoft.
 
 Fluxo:
-1. Conecta no Supabase
+1. Acorda a API Render enquanto conecta no Supabase
 2. Busca produtos com status 'pendente'
-3. Consulta API Render (que rotaciona tokens Bluesoft)
-4. Atualiza status e dados no Supabase
-5. Gera relatório detalhado
+3. Escolhe os mais importantes cabendo nos créditos restantes do dia
+4. Consulta API Render (que rotaciona tokens Bluesoft) em lotes, vários em paralelo
+5. Atualiza status e dados no Supabase
+6. Gera relatório detalhado
 
 Autor: Sistema Ciclik
 Data: 26/01/2026
@@ -19,11 +20,23 @@ Data: 26/01/2026
 
 import os
 import sys
+import heapq
 import json
 import time
 import requests
-from datetime import datetime
-from typing import Dict, List, Optional
+import queue
+import threading
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from itertools import chain, islice
+from typing import Dict, Iterator, List, Optional
+
+# Validação de GTIN e percentil compartilhados com a API (render-api/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'render-api'))
+from metricas import percentil
+from validacao_gtin import gtin_para_consulta, normalizar_gtin
 
 # ==================== CONFIGURAÇÃO ====================
 
@@ -32,7 +45,23 @@ SUPABASE_KEY = os.environ.get('SUPABASE_SERVICE_KEY')
 API_RENDER_URL = os.environ.get('API_RENDER_URL', 'https://ciclik-api-produtos.onrender.com')
 API_RENDER_TOKEN = os.environ.get('API_RENDER_TOKEN', 'ciclik_secret_token_2026')
 LIMITE_PRODUTOS = int(os.environ.get('LIMITE_PRODUTOS', '100'))
+PAGINA_PENDENTES = max(1, int(os.environ.get('PAGINA_PENDENTES', '500')))  # Linhas por página (keyset)
 MODO_TESTE = os.environ.get('MODO_TESTE', 'false').lower() == 'true'
+CONCORRENCIA = max(1, int(os.environ.get('CONCORRENCIA', '4')))  # Lotes de consulta em paralelo
+TAMANHO_LOTE_CONSULTA = max(1, int(os.environ.get('TAMANHO_LOTE_CONSULTA', '10')))  # GTINs por POST /api/produtos/lote
+DELAY_ENTRE_REQUISICOES = float(os.environ.get('DELAY_ENTRE_REQUISICOES', '0'))  # Segundos, por thread entre lotes
+TAMANHO_LOTE_ESCRITA = max(1, int(os.environ.get('TAMANHO_LOTE_ESCRITA', '25')))  # Produtos acumulados por gravação
+TAMANHO_LOTE_LOG = max(1, int(os.environ.get('TAMANHO_LOTE_LOG', '50')))  # Logs por insert
+PRAZO_ENCERRAMENTO_LOGS = float(os.environ.get('PRAZO_ENCERRAMENTO_LOGS', '30'))  # Segundos
+LOG_ON_CONFLICT = os.environ.get('LOG_ON_CONFLICT', '')  # Coluna com UNIQUE em log_consultas_api ('' = insert simples)
+TEMPO_MAX_AQUECIMENTO = float(os.environ.get('TEMPO_MAX_AQUECIMENTO', '180'))  # Segundos para a API acordar
+DIARIO_CONSULTAS = os.environ.get(  # Journal local de consultas pagas ('' desativa)
+    'DIARIO_CONSULTAS', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'diario', 'consultas.jsonl')
+)
+RELATORIO_JSON = os.environ.get(  # Relatório da execução com tempos por etapa ('' desativa)
+    'RELATORIO_JSON', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'relatorio-processamento.json')
+)
+PRIORIDADE = os.environ.get('PRIORIDADE', 'ocorrencias=1,idade=0.05,falhas=-2')  # Critério=peso, separados por vírgula
 
 # Validação de variáveis obrigatórias
 if not SUPABASE_URL or not SUPABASE_KEY:
@@ -63,59 +92,142 @@ def log(mensagem: str, nivel: str = 'INFO'):
     
     print(f"[{timestamp}] {icone} {mensagem}")
 
-def buscar_produtos_pendentes(limite: int = 100) -> List[Dict]:
-    """Busca produtos com status 'pendente' ou 'acao_manual' no Supabase"""
-    log(f"Buscando até {limite} produtos pendentes...")
+class CronometroEtapas:
+    """
+    Tempo (ms) de cada chamada de I/O, agrupado por etapa (Render, leituras
+    e escritas no Supabase, esperas...). Mostra no relatório final qual etapa
+    consome a execução e grava o histograma no relatório JSON.
+    """
+    
+    FAIXAS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._amostras = defaultdict(list)
     
+    @contextmanager
+    def medir(self, etapa: str):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(etapa, (time.perf_counter() - inicio) * 1000)
+    
+    def registrar(self, etapa: str, duracao_ms: float):
+        with self._lock:
+            self._amostras[etapa].append(duracao_ms)
+    
+    def resumo(self) -> Dict:
+        """{etapa: chamadas, total/média/p50/p95/máx em ms e histograma por faixa}"""
+        with self._lock:
+            amostras = {etapa: sorted(v) for etapa, v in self._amostras.items()}
+        
+        resumo = {}
+        for etapa, valores in sorted(amostras.items()):
+            histograma = {f"<={limite}": 0 for limite in self.FAIXAS_MS}
+            histograma[f">{self.FAIXAS_MS[-1]}"] = 0
+            for valor in valores:
+                faixa = next((f"<={l}" for l in self.FAIXAS_MS if valor <= l), f">{self.FAIXAS_MS[-1]}")
+                histograma[faixa] += 1
+            
+            resumo[etapa] = {
+                'chamadas': len(valores),
+                'total_ms': round(sum(valores), 1),
+                'media_ms': round(sum(valores) / len(valores), 1),
+                'p50_ms': round(percentil(valores, 50), 1),
+                'p95_ms': round(percentil(valores, 95), 1),
+                'max_ms': round(valores[-1], 1),
+                'histograma_ms': histograma
+            }
+        return resumo
+
+# Tempos por etapa da execução atual
+cronometro = CronometroEtapas()
+
+def colunas_pendentes() -> str:
+    """Colunas lidas de produtos_em_analise: as do processamento mais as dos critérios de prioridade em uso"""
+    colunas = ['id', 'ean_gtin', 'descricao', 'created_at']
+    for nome in PESOS_PRIORIDADE:
+        colunas += [c for c in COLUNAS_CRITERIOS[nome] if c not in colunas]
+    return ','.join(colunas)
+
+def iterar_produtos_pendentes(tamanho_pagina: int = PAGINA_PENDENTES) -> Iterator[Dict]:
+    """
+    Percorre os produtos com status 'pendente' ou 'acao_manual' em ordem de
+    chegada, uma página por vez (paginação por chave em (created_at, id), sem
+    offset). As páginas só são buscadas conforme as linhas são consumidas.
+    """
     url = f"{SUPABASE_URL}/rest/v1/produtos_em_analise"
     params = {
         'status': 'in.(pendente,acao_manual)',
-        'order': 'created_at.asc',
-        'limit': limite,
-        'select': 'id,ean_gtin,descricao,created_at'
+        'order': 'created_at.asc,id.asc',
+        'limit': tamanho_pagina,
+        'select': colunas_pendentes()
     }
     
-    try:
-        response = requests.get(url, headers=SUPABASE_HEADERS, params=params, timeout=30)
-        response.raise_for_status()
-        produtos = response.json()
+    while True:
+        try:
+            with cronometro.medir('supabase_leitura'):
+                response = requests.get(url, headers=SUPABASE_HEADERS, params=params, timeout=30)
+            response.raise_for_status()
+            pagina = response.json()
+        except requests.exceptions.RequestException as e:
+            log(f"Erro ao buscar produtos: {e}", 'ERROR')
+            return
         
-        log(f"Encontrados {len(produtos)} produtos para processar", 'SUCCESS')
-        return produtos
-    
-    except requests.exceptions.RequestException as e:
-        log(f"Erro ao buscar produtos: {e}", 'ERROR')
-        return []
+        yield from pagina
+        
+        if len(pagina) < tamanho_pagina:
+            return
+        
+        # Próxima página: tudo depois da última linha lida
+        ultimo = pagina[-1]
+        params['or'] = (
+            f'(created_at.gt."{ultimo["created_at"]}",'
+            f'and(created_at.eq."{ultimo["created_at"]}",id.gt.{ultimo["id"]}))'
+        )
 
-def validar_gtin(gtin: str) -> bool:
-    """Valida formato do GTIN (8, 12, 13 ou 14 dígitos numéricos)"""
-    if not gtin or not isinstance(gtin, str):
-        return False
-    
-    # Remove espaços
-    gtin = gtin.strip()
+def resultado_gtin_invalido(gtin: str, motivo: str) -> Dict:
+    """Resultado de um GTIN recusado antes de consultar (mesma regra da API: não gasta crédito)"""
+    log(f"  ⚠️ GTIN {gtin}: {motivo}", 'WARNING')
+    return {
+        'dados': {'encontrado': False, 'mensagem': f'GTIN inválido: {motivo}'},
+        'tempo_resposta': 0,
+        'sucesso': False,
+        'erro': 'GTIN_INVALIDO'
+    }
+
+def interpretar_resposta(gtin: str, status_http: int, dados: Optional[Dict], tempo_resposta: int) -> Optional[Dict]:
+    """Resultado de uma consulta a partir do status HTTP (None se a API falhou)"""
+    if status_http == 200:
+        log(f"  ✅ GTIN {gtin}: {dados.get('encontrado', False)} ({tempo_resposta}ms)", 'DEBUG')
+        return {
+            'dados': dados,
+            'tempo_resposta': tempo_resposta,
+            'sucesso': True
+        }
     
-    # Verifica se é numérico
-    if not gtin.isdigit():
-        return False
+    if status_http == 429:
+        log(f"  🚫 GTIN {gtin}: Rate limit atingido (429)", 'WARNING')
+        return {
+            'dados': None,
+            'tempo_resposta': tempo_resposta,
+            'sucesso': False,
+            'erro': 'RATE_LIMIT'
+        }
     
-    # Verifica tamanho (GTIN-8, GTIN-12, GTIN-13, GTIN-14)
-    return len(gtin) in [8, 12, 13, 14]
+    log(f"  ⚠️ GTIN {gtin}: HTTP {status_http}", 'WARNING')
+    return None
 
 def consultar_api_render(gtin: str, retry: int = 3) -> Optional[Dict]:
     """Consulta a API Render com retry para cold start"""
     
-    # Validar GTIN antes de consultar
-    if not validar_gtin(gtin):
-        log(f"  ⚠️ GTIN {gtin}: Formato inválido (apenas 8, 12, 13 ou 14 dígitos)", 'WARNING')
-        return {
-            'dados': {'encontrado': False, 'mensagem': 'GTIN inválido'},
-            'tempo_resposta': 0,
-            'sucesso': False,
-            'erro': 'GTIN_INVALIDO'
-        }
+    # Validar GTIN antes de consultar (mesma regra da API: não gasta crédito)
+    canonico, motivo = normalizar_gtin(gtin)
+    if not canonico:
+        return resultado_gtin_invalido(gtin, motivo)
     
-    url = f"{API_RENDER_URL}/api/produtos/{gtin}"
+    url = f"{API_RENDER_URL}/api/produtos/{gtin_para_consulta(canonico)}"
     headers = {
         'Authorization': f'Bearer {API_RENDER_TOKEN}',
         'Content-Type': 'application/json'
@@ -124,77 +236,293 @@ def consultar_api_render(gtin: str, retry: int = 3) -> Optional[Dict]:
     for tentativa in range(1, retry + 1):
         try:
             tempo_inicio = time.time()
-            response = requests.get(url, headers=headers, timeout=90)  # 90s para cold start
+            with cronometro.medir('render_consulta'):
+                response = requests.get(url, headers=headers, timeout=90)  # 90s para cold start
+            tempo_resposta = int((time.time() - tempo_inicio) * 1000)
+            
+            resultado = interpretar_resposta(
+                gtin, response.status_code,
+                response.json() if response.status_code == 200 else None,
+                tempo_resposta
+            )
+            if resultado:
+                return resultado
+                
+        except requests.exceptions.Timeout:
+            if tentativa < retry:
+                log(f"  ⏱️ Timeout (tentativa {tentativa}/{retry}) - Cold start detectado", 'WARNING')
+                with cronometro.medir('render_espera_retry'):
+                    time.sleep(5 * tentativa)  # Backoff exponencial
+                continue
+            else:
+                log(f"  ❌ GTIN {gtin}: Timeout após {retry} tentativas", 'ERROR')
+        
+        except requests.exceptions.RequestException as e:
+            log(f"  ❌ GTIN {gtin}: Erro de rede - {e}", 'ERROR')
+    
+    return None
+
+def consultar_lote_api_render(gtins: List[str], retry: int = 3) -> Optional[Dict[str, Optional[Dict]]]:
+    """
+    Consulta vários GTINs (já validados) em um único POST /api/produtos/lote,
+    com retry para cold start. Retorna {gtin: resultado no formato de
+    consultar_api_render, ou None se aquele GTIN falhou}, ou None se o lote
+    inteiro falhou. API sem a rota de lote: uma consulta por GTIN.
+    """
+    url = f"{API_RENDER_URL}/api/produtos/lote"
+    headers = {
+        'Authorization': f'Bearer {API_RENDER_TOKEN}',
+        'Content-Type': 'application/json'
+    }
+    
+    for tentativa in range(1, retry + 1):
+        try:
+            tempo_inicio = time.time()
+            with cronometro.medir('render_consulta'):
+                response = requests.post(url, headers=headers, json={'gtins': gtins}, timeout=90)
             tempo_resposta = int((time.time() - tempo_inicio) * 1000)
             
             if response.status_code == 200:
-                dados = response.json()
-                log(f"  ✅ GTIN {gtin}: {dados.get('encontrado', False)} ({tempo_resposta}ms)", 'DEBUG')
                 return {
-                    'dados': dados,
-                    'tempo_resposta': tempo_resposta,
-                    'sucesso': True
+                    item['ean_gtin']: interpretar_resposta(
+                        item['ean_gtin'], item['status'], item['resposta'], tempo_resposta
+                    )
+                    for item in response.json().get('resultados', [])
                 }
             
-            elif response.status_code == 429:
-                log(f"  🚫 GTIN {gtin}: Rate limit atingido (429)", 'WARNING')
-                return {
-                    'dados': None,
-                    'tempo_resposta': tempo_resposta,
-                    'sucesso': False,
-                    'erro': 'RATE_LIMIT'
-                }
+            if response.status_code in (404, 405):
+                log("  ℹ️ API sem consulta em lote - consultando um GTIN por vez", 'DEBUG')
+                return {gtin: consultar_api_render(gtin, retry) for gtin in gtins}
             
-            else:
-                log(f"  ⚠️ GTIN {gtin}: HTTP {response.status_code}", 'WARNING')
-                
+            log(f"  ⚠️ Lote de {len(gtins)} GTINs: HTTP {response.status_code}", 'WARNING')
+        
         except requests.exceptions.Timeout:
             if tentativa < retry:
                 log(f"  ⏱️ Timeout (tentativa {tentativa}/{retry}) - Cold start detectado", 'WARNING')
-                time.sleep(5 * tentativa)  # Backoff exponencial
+                with cronometro.medir('render_espera_retry'):
+                    time.sleep(5 * tentativa)  # Backoff exponencial
                 continue
-            else:
-                log(f"  ❌ GTIN {gtin}: Timeout após {retry} tentativas", 'ERROR')
+            log(f"  ❌ Lote de {len(gtins)} GTINs: Timeout após {retry} tentativas", 'ERROR')
         
         except requests.exceptions.RequestException as e:
-            log(f"  ❌ GTIN {gtin}: Erro de rede - {e}", 'ERROR')
+            log(f"  ❌ Lote de {len(gtins)} GTINs: Erro de rede - {e}", 'ERROR')
     
     return None
 
-def atualizar_produto_supabase(produto_id: str, dados_api: Dict, tempo_resposta: int) -> bool:
-    """Atualiza produto no Supabase com dados da API"""
+def montar_atualizacao(produto: Dict, dados_api: Dict) -> Dict:
+    """Resultado da consulta para uma linha de produtos_em_analise (o que vai para o journal)"""
+    return {
+        'id': produto['id'],
+        'ean_gtin': produto['ean_gtin'],
+        'dados_api': dados_api,
+        'consultado_em': datetime.utcnow().isoformat()
+    }
+
+def atualizar_se_pendente(ids: List[str], linha: Dict) -> Optional[List[str]]:
+    """
+    Aplica o resultado de uma consulta (mesmo dados_api) às linhas `ids` que
+    ainda estão 'pendente' ou 'acao_manual' (PATCH condicional: linhas já
+    tratadas por um admin ou removidas ficam como estão). Retorna os ids
+    atualizados, ou None se a requisição falhou.
+    """
     if MODO_TESTE:
-        log(f"  [TESTE] Produto {produto_id} seria atualizado", 'DEBUG')
-        return True
+        log(f"  [TESTE] {len(ids)} produto(s) seriam atualizados", 'DEBUG')
+        return list(ids)
     
     url = f"{SUPABASE_URL}/rest/v1/produtos_em_analise"
-    params = {'id': f'eq.{produto_id}'}
-    
+    params = {
+        'id': f"in.({','.join(str(produto_id) for produto_id in ids)})",
+        'status': 'in.(pendente,acao_manual)',
+        'select': 'id'
+    }
     payload = {
-        'dados_api': dados_api,
-        'consultado_em': datetime.utcnow().isoformat(),
+        'dados_api': linha['dados_api'],
+        'consultado_em': linha['consultado_em'],
         'status': 'consultado',
         'updated_at': datetime.utcnow().isoformat()
     }
     
     try:
-        response = requests.patch(url, headers=SUPABASE_HEADERS, params=params, json=payload, timeout=30)
+        with cronometro.medir('supabase_patch'):
+            response = requests.patch(url, headers=SUPABASE_HEADERS, params=params, json=payload, timeout=30)
         response.raise_for_status()
-        return True
+        return [item['id'] for item in response.json()]
     
-    except requests.exceptions.RequestException as e:
-        log(f"  ❌ Erro ao atualizar produto {produto_id}: {e}", 'ERROR')
-        return False
+    except (requests.exceptions.RequestException, ValueError) as e:
+        log(f"  ⚠️ Erro ao regravar {len(ids)} produto(s) do journal: {e}", 'WARNING')
+        return None
 
-def registrar_log_consulta(admin_id: str, produto_id: str, gtin: str, sucesso: bool, tempo_resposta: int, resposta_api: Dict) -> bool:
-    """Registra consulta no log_consultas_api (ignora duplicatas silenciosamente)"""
-    if MODO_TESTE:
-        log(f"  [TESTE] Log seria registrado para {gtin}", 'DEBUG')
-        return True
+def gravar_se_pendentes(itens: List[tuple]) -> int:
+    """
+    Grava os resultados [(linha, log_consulta)] com PATCH condicional: um por
+    dados_api distinto (linhas do mesmo GTIN têm o mesmo resultado), em
+    partes de até TAMANHO_LOTE_ESCRITA linhas, até CONCORRENCIA em paralelo.
+    Parte recusada: tenta linha a linha. O que a requisição aceitou é confirmado no journal e tem o log
+    registrado (a consulta foi paga mesmo se a linha já tinha sido tratada
+    ou removida); o que falhou fica no journal para a próxima execução.
+    Retorna quantas linhas foram atualizadas.
+    """
+    por_resultado = {}
+    for linha, log_consulta in itens:
+        chave = json.dumps(linha['dados_api'], sort_keys=True)
+        por_resultado.setdefault(chave, []).append((linha, log_consulta))
     
-    url = f"{SUPABASE_URL}/rest/v1/log_consultas_api"
+    partes = [
+        grupo[inicio:inicio + TAMANHO_LOTE_ESCRITA]
+        for grupo in por_resultado.values()
+        for inicio in range(0, len(grupo), TAMANHO_LOTE_ESCRITA)
+    ]
     
-    payload = {
+    atualizados = 0
+    with ThreadPoolExecutor(max_workers=CONCORRENCIA) as executor:
+        while partes:
+            respostas = list(executor.map(
+                lambda parte: atualizar_se_pendente([linha['id'] for linha, _ in parte], parte[0][0]),
+                partes
+            ))
+            
+            repetir = []
+            for parte, regravados in zip(partes, respostas):
+                if regravados is None:
+                    if len(parte) > 1:
+                        repetir.extend([item] for item in parte)
+                    continue
+                
+                atualizados += len(regravados)
+                diario_consultas.confirmar([linha['id'] for linha, _ in parte])
+                for _, log_consulta in parte:
+                    if log_consulta:
+                        escritor_logs.enfileirar(log_consulta)
+            partes = repetir
+    
+    return atualizados
+
+class DiarioConsultas:
+    """
+    Journal append-only (JSON Lines) das consultas já respondidas pela API.
+    Cada resultado é anotado antes de entrar no buffer e confirmado depois
+    de gravado no Supabase. Se o job cair (timeout, cancelamento, erro), a
+    próxima execução regrava o que ficou sem confirmação antes de gastar
+    créditos novos — nenhuma resposta paga é jogada fora.
+    """
+    
+    def __init__(self, caminho: Optional[str]):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._arquivo = None
+    
+    def _escrever(self, entrada: Dict):
+        """Acrescenta uma linha e força a escrita (sobrevive a um kill do processo)"""
+        if not self.caminho:
+            return
+        with self._lock:
+            if self._arquivo is None:
+                os.makedirs(os.path.dirname(self.caminho) or '.', exist_ok=True)
+                self._arquivo = open(self.caminho, 'a', encoding='utf-8')
+                # Linha cortada por uma interrupção não pode engolir a próxima entrada
+                if self._arquivo.tell() > 0:
+                    with open(self.caminho, 'rb') as existente:
+                        existente.seek(-1, os.SEEK_END)
+                        if existente.read(1) != b'\n':
+                            self._arquivo.write('\n')
+            self._arquivo.write(json.dumps(entrada, ensure_ascii=False) + '\n')
+            self._arquivo.flush()
+    
+    def registrar(self, linha: Dict, log_consulta: Optional[Dict]):
+        """Anota um resultado ainda não gravado no Supabase"""
+        self._escrever({'tipo': 'consulta', 'linha': linha, 'log': log_consulta})
+    
+    def confirmar(self, ids: List[str]):
+        """Anota que estes produtos já foram gravados no Supabase"""
+        if ids:
+            self._escrever({'tipo': 'gravado', 'ids': ids})
+    
+    def nao_gravados(self) -> List[tuple]:
+        """Resultados anotados e nunca confirmados: [(linha, log_consulta)]"""
+        if not self.caminho or not os.path.exists(self.caminho):
+            return []
+        
+        consultas = {}
+        with open(self.caminho, encoding='utf-8') as arquivo:
+            for texto in arquivo:
+                try:
+                    entrada = json.loads(texto)
+                except ValueError:
+                    # Última linha cortada pela interrupção do job
+                    continue
+                if entrada.get('tipo') == 'consulta':
+                    consultas[entrada['linha']['id']] = (entrada['linha'], entrada.get('log'))
+                elif entrada.get('tipo') == 'gravado':
+                    for produto_id in entrada['ids']:
+                        consultas.pop(produto_id, None)
+        
+        return list(consultas.values())
+    
+    def compactar(self):
+        """Reescreve o journal só com o que falta gravar (vazio se não sobrou nada)"""
+        if not self.caminho:
+            return
+        with self._lock:
+            if self._arquivo is not None:
+                self._arquivo.close()
+                self._arquivo = None
+        
+        # O arquivo vazio também é salvo no cache do workflow, substituindo
+        # um journal antigo que já foi retomado
+        restantes = self.nao_gravados()
+        os.makedirs(os.path.dirname(self.caminho) or '.', exist_ok=True)
+        temporario = f"{self.caminho}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            for linha, log_consulta in restantes:
+                arquivo.write(json.dumps(
+                    {'tipo': 'consulta', 'linha': linha, 'log': log_consulta}, ensure_ascii=False
+                ) + '\n')
+        os.replace(temporario, self.caminho)
+
+# Em modo de teste nada é gravado no Supabase, então não há o que retomar
+diario_consultas = DiarioConsultas(None if MODO_TESTE else DIARIO_CONSULTAS)
+
+class BufferAtualizacoes:
+    """
+    Acumula os resultados e grava em produtos_em_analise a cada
+    TAMANHO_LOTE_ESCRITA produtos (um PATCH por resultado distinto em vez
+    de um por produto, só em linhas ainda pendentes). O log de cada consulta
+    só é registrado depois que o produto foi gravado, como antes.
+    """
+    
+    def __init__(self, tamanho_lote: int):
+        self.tamanho_lote = tamanho_lote
+        self._pendentes = []
+        self._lock = threading.Lock()
+    
+    def adicionar(self, produto: Dict, dados_api: Dict, log_consulta: Optional[Dict] = None):
+        """Enfileira um resultado; grava o lote quando atinge o tamanho configurado"""
+        linha = montar_atualizacao(produto, dados_api)
+        diario_consultas.registrar(linha, log_consulta)
+        
+        with self._lock:
+            self._pendentes.append((linha, log_consulta))
+            cheio = len(self._pendentes) >= self.tamanho_lote
+        
+        if cheio:
+            self.descarregar()
+    
+    def descarregar(self) -> int:
+        """Grava tudo que está pendente; retorna quantos produtos foram atualizados"""
+        with self._lock:
+            itens, self._pendentes = self._pendentes, []
+        
+        if not itens:
+            return 0
+        
+        return gravar_se_pendentes(itens)
+
+# Resultados aguardando gravação em lote no Supabase
+buffer_atualizacoes = BufferAtualizacoes(TAMANHO_LOTE_ESCRITA)
+
+def montar_log_consulta(admin_id: str, produto_id: str, gtin: str, sucesso: bool, tempo_resposta: int, resposta_api: Dict) -> Dict:
+    """Linha de log_consultas_api para uma consulta"""
+    return {
         'admin_id': admin_id,
         'produto_id': produto_id,
         'ean_gtin': gtin,
@@ -203,9 +531,20 @@ def registrar_log_consulta(admin_id: str, produto_id: str, gtin: str, sucesso: b
         'resposta_api': resposta_api,
         'erro_mensagem': None if sucesso else resposta_api.get('mensagem')
     }
+
+def registrar_log_consulta(admin_id: str, produto_id: str, gtin: str, sucesso: bool, tempo_resposta: int, resposta_api: Dict) -> bool:
+    """Registra consulta no log_consultas_api (ignora duplicatas silenciosamente)"""
+    if MODO_TESTE:
+        log(f"  [TESTE] Log seria registrado para {gtin}", 'DEBUG')
+        return True
+    
+    url = f"{SUPABASE_URL}/rest/v1/log_consultas_api"
+    
+    payload = montar_log_consulta(admin_id, produto_id, gtin, sucesso, tempo_resposta, resposta_api)
     
     try:
-        response = requests.post(url, headers=SUPABASE_HEADERS, json=payload, timeout=30)
+        with cronometro.medir('supabase_log'):
+            response = requests.post(url, headers=SUPABASE_HEADERS, json=payload, timeout=30)
         
         # Se for 409 (Conflict), significa que já existe log para este produto
         # Isso é NORMAL e esperado - não loga nada
@@ -220,6 +559,129 @@ def registrar_log_consulta(admin_id: str, produto_id: str, gtin: str, sucesso: b
         log(f"  ⚠️ Erro ao registrar log para {gtin}: {e}", 'WARNING')
         return False
 
+def registrar_logs_em_lote(logs: List[Dict]) -> bool:
+    """
+    Insere vários logs em um único POST. Com LOG_ON_CONFLICT, os que já
+    existem são ignorados (ON CONFLICT DO NOTHING, exige UNIQUE na coluna);
+    sem ele, uma duplicata recusa o lote e _gravar tenta um a um.
+    """
+    if MODO_TESTE:
+        log(f"  [TESTE] {len(logs)} logs seriam registrados em lote", 'DEBUG')
+        return True
+    
+    url = f"{SUPABASE_URL}/rest/v1/log_consultas_api"
+    params = {}
+    headers = {**SUPABASE_HEADERS, 'Prefer': 'return=minimal'}
+    if LOG_ON_CONFLICT:
+        params['on_conflict'] = LOG_ON_CONFLICT
+        headers['Prefer'] = 'resolution=ignore-duplicates,return=minimal'
+    
+    try:
+        with cronometro.medir('supabase_logs_lote'):
+            response = requests.post(
+                url, headers=headers, params=params,
+                json=[montar_log_consulta(**item) for item in logs],
+                timeout=30
+            )
+        response.raise_for_status()
+        return True
+    
+    except requests.exceptions.RequestException as e:
+        log(f"  ⚠️ Erro ao registrar lote de {len(logs)} logs: {e}", 'WARNING')
+        return False
+
+class EscritorLogs:
+    """
+    Grava os logs de consulta em segundo plano (write-behind): as threads
+    de processamento só enfileiram, e uma thread dedicada envia os logs em
+    lotes enquanto as próximas consultas à API acontecem.
+    """
+    
+    FIM = object()  # Sinal de encerramento da fila
+    
+    def __init__(self, tamanho_lote: int, intervalo: float = 1.0):
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self._fila = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._encerrado = False
+        self.gravados = 0
+        self.falhas = 0
+    
+    def enfileirar(self, log_consulta: Dict):
+        """
+        Agenda um log (mesmos argumentos de registrar_log_consulta).
+        Depois de encerrar(), o log é gravado na hora: o FIM já está na fila
+        e a thread não leria nada enfileirado depois dele.
+        """
+        with self._lock:
+            if not self._encerrado:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._executar, name='escritor-logs', daemon=True)
+                    self._thread.start()
+                self._fila.put(log_consulta)
+                return
+        self._gravar([log_consulta])
+    
+    def _executar(self):
+        """Laço da thread: junta até tamanho_lote logs (ou o que chegar em intervalo) e grava"""
+        encerrar = False
+        while not encerrar:
+            item = self._fila.get()
+            if item is self.FIM:
+                break
+            
+            lote = [item]
+            limite = time.time() + self.intervalo
+            while len(lote) < self.tamanho_lote:
+                try:
+                    item = self._fila.get(timeout=max(0, limite - time.time()))
+                except queue.Empty:
+                    break
+                if item is self.FIM:
+                    encerrar = True
+                    break
+                lote.append(item)
+            
+            self._gravar(lote)
+    
+    def _gravar(self, lote: List[Dict]):
+        if registrar_logs_em_lote(lote):
+            self.gravados += len(lote)
+            return
+        
+        # Lote recusado: um a um (409 de duplicata continua sendo ignorado)
+        for item in lote:
+            if registrar_log_consulta(**item):
+                self.gravados += 1
+            else:
+                self.falhas += 1
+    
+    def encerrar(self, prazo: float) -> int:
+        """
+        Espera a fila esvaziar por até `prazo` segundos.
+        Retorna quantos logs ficaram sem gravar.
+        """
+        with self._lock:
+            self._encerrado = True
+            if self._thread is None or not self._thread.is_alive():
+                return 0
+            self._fila.put(self.FIM)
+        
+        self._thread.join(timeout=prazo)
+        
+        if not self._thread.is_alive():
+            return 0
+        
+        # A fila ainda contém o FIM (a não ser que o último lote já o tenha lido)
+        pendentes = max(0, self._fila.qsize() - 1)
+        log(f"⚠️ Prazo de {prazo:.0f}s esgotado - {pendentes} logs não foram gravados", 'WARNING')
+        return pendentes
+
+# Logs de consulta gravados em segundo plano
+escritor_logs = EscritorLogs(TAMANHO_LOTE_LOG)
+
 def obter_status_tokens() -> Optional[Dict]:
     """Consulta status dos tokens na API Render (suporta cold start)"""
     url = f"{API_RENDER_URL}/api/status/tokens"
@@ -227,7 +689,8 @@ def obter_status_tokens() -> Optional[Dict]:
     
     try:
         # Timeout de 90s para suportar cold start (Render pode demorar 30-60s)
-        response = requests.get(url, headers=headers, timeout=90)
+        with cronometro.medir('render_status'):
+            response = requests.get(url, headers=headers, timeout=90)
         response.raise_for_status()
         return response.json()
     
@@ -241,6 +704,43 @@ def obter_status_tokens() -> Optional[Dict]:
         # Não é crítico, retorna None e continua processamento
         return None
 
+def aquecer_api_render(cancelar: Optional[threading.Event] = None) -> Dict:
+    """
+    Faz ping no /ready da API Render até ela responder 200 (cold start do
+    plano free pode levar 30-60s, mais o aquecimento dos caches). Versões
+    antigas da API não têm /ready (404): aí basta o /health. Roda em
+    paralelo com as leituras do Supabase. Retorna {'pronta', 'tempo' (s),
+    'tentativas'}.
+    """
+    url = f"{API_RENDER_URL}/ready"
+    inicio = time.time()
+    limite = inicio + TEMPO_MAX_AQUECIMENTO
+    tentativas = 0
+    
+    while time.time() < limite and not (cancelar and cancelar.is_set()):
+        tentativas += 1
+        try:
+            restante = max(1, limite - time.time())
+            with cronometro.medir('render_health'):
+                response = requests.get(url, timeout=min(30, restante))
+            if response.status_code == 200:
+                return {'pronta': True, 'tempo': time.time() - inicio, 'tentativas': tentativas}
+            if response.status_code == 404 and url.endswith('/ready'):
+                url = f"{API_RENDER_URL}/health"
+                continue
+            # 502/503 enquanto o Render sobe a instância ou aquece os caches
+            log(f"  🌅 API ainda acordando (HTTP {response.status_code})", 'DEBUG')
+        except requests.exceptions.RequestException as e:
+            log(f"  🌅 API ainda acordando ({type(e).__name__})", 'DEBUG')
+        
+        with cronometro.medir('render_espera_aquecimento'):
+            if cancelar:
+                cancelar.wait(2)
+            else:
+                time.sleep(2)
+    
+    return {'pronta': False, 'tempo': time.time() - inicio, 'tentativas': tentativas}
+
 def obter_admin_id() -> str:
     """
     Obtém ID de um admin para registrar logs.
@@ -254,7 +754,8 @@ def obter_admin_id() -> str:
     }
     
     try:
-        response = requests.get(url, headers=SUPABASE_HEADERS, params=params, timeout=30)
+        with cronometro.medir('supabase_admin'):
+            response = requests.get(url, headers=SUPABASE_HEADERS, params=params, timeout=30)
         
         # Se a tabela existe e tem dados
         if response.status_code == 200:
@@ -273,8 +774,284 @@ def obter_admin_id() -> str:
         log(f"⚠️ Erro ao buscar admin: {e}", 'WARNING')
         return '00000000-0000-0000-0000-000000000000'
 
+def registrar_resultado(grupo: List[Dict], resultado: Optional[Dict], admin_id: str) -> Dict:
+    """
+    Grava o resultado de um GTIN em todas as linhas pendentes do grupo
+    (mesmo produto escaneado por vários usuários). Retorna
+    {'situacao': chave de estatística, 'tempo_resposta': ms, 'linhas': len(grupo)}.
+    """
+    if not resultado:
+        return {'situacao': 'erro', 'tempo_resposta': 0, 'linhas': len(grupo)}
+    
+    # Verificar GTIN inválido
+    if resultado.get('erro') == 'GTIN_INVALIDO':
+        # Ainda atualiza o produto para 'consultado' com erro
+        for linha in grupo:
+            buffer_atualizacoes.adicionar(linha, resultado['dados'])
+        return {'situacao': 'gtin_invalido', 'tempo_resposta': 0, 'linhas': len(grupo)}
+    
+    # Verificar rate limit
+    if resultado.get('erro') == 'RATE_LIMIT':
+        return {'situacao': 'rate_limit', 'tempo_resposta': 0, 'linhas': len(grupo)}
+    
+    # Processar resultado
+    dados_api = resultado.get('dados', {})
+    tempo_resposta = resultado.get('tempo_resposta', 0)
+    encontrado = dados_api.get('encontrado', False)
+    
+    # Mesmo resultado para todas as linhas do grupo: atualizar no Supabase
+    # (em lote) e registrar log de cada uma depois de gravada
+    for linha in grupo:
+        buffer_atualizacoes.adicionar(linha, dados_api, {
+            'admin_id': admin_id,
+            'produto_id': linha['id'],
+            'gtin': linha['ean_gtin'],
+            'sucesso': encontrado,
+            'tempo_resposta': tempo_resposta,
+            'resposta_api': dados_api
+        })
+    
+    return {
+        'situacao': 'sucesso' if encontrado else 'nao_encontrado',
+        'tempo_resposta': tempo_resposta,
+        'linhas': len(grupo)
+    }
+
+def processar_lote(inicio: int, total, grupos: List[List[Dict]], admin_id: str) -> List[Dict]:
+    """
+    Consulta os GTINs de vários grupos em uma única requisição à API e grava
+    cada resultado em todas as linhas do grupo. GTINs inválidos não vão para
+    a API. Executado em paralelo pelas threads do main(); retorna o
+    resultado de registrar_resultado() de cada grupo, na mesma ordem.
+    """
+    codigos = []
+    for i, grupo in enumerate(grupos, inicio):
+        produto = grupo[0]
+        descricao = (produto.get('descricao') or 'Sem descrição')[:50]
+        duplicados = f" (+{len(grupo) - 1} linha(s) com o mesmo GTIN)" if len(grupo) > 1 else ""
+        log(f"[{i}/{total}] Processando: {produto['ean_gtin']} - {descricao}{duplicados}")
+        
+        canonico = normalizar_gtin(produto['ean_gtin'])[0]
+        codigos.append(gtin_para_consulta(canonico) if canonico else None)
+    
+    validos = [codigo for codigo in codigos if codigo]
+    respostas = (consultar_lote_api_render(validos) if validos else None) or {}
+    
+    resultados = []
+    for grupo, codigo in zip(grupos, codigos):
+        if codigo:
+            resultado = respostas.get(codigo)
+        else:
+            gtin = grupo[0]['ean_gtin']
+            resultado = resultado_gtin_invalido(gtin, normalizar_gtin(gtin)[1])
+        resultados.append(registrar_resultado(grupo, resultado, admin_id))
+    
+    # Delay opcional entre requisições de cada thread (evitar sobrecarga)
+    if DELAY_ENTRE_REQUISICOES > 0:
+        with cronometro.medir('pausa_entre_requisicoes'):
+            time.sleep(DELAY_ENTRE_REQUISICOES)
+    
+    return resultados
+
+def retomar_diario() -> int:
+    """
+    Grava no Supabase os resultados que uma execução anterior consultou
+    (e pagou) mas não chegou a gravar. Roda antes de buscar pendentes,
+    para essas linhas não serem consultadas de novo. Só linhas ainda
+    pendentes são atualizadas; o log de cada consulta paga é registrado
+    de qualquer forma. Retorna quantas linhas foram atualizadas.
+    """
+    pendentes = diario_consultas.nao_gravados()
+    if not pendentes:
+        return 0
+    
+    log(f"♻️ Retomando {len(pendentes)} resultado(s) não gravados da execução anterior...", 'WARNING')
+    atualizados = gravar_se_pendentes(pendentes)
+    
+    ignorados = len(pendentes) - atualizados
+    log(f"♻️ {atualizados} resultado(s) recuperados sem gastar créditos"
+        + (f" ({ignorados} já tratados ou removidos, mantidos como estão)" if ignorados else ""), 'SUCCESS')
+    return atualizados
+
+# ==================== PRIORIZAÇÃO ====================
+
+def dias_desde(data_iso: Optional[str]) -> float:
+    """Dias decorridos desde um timestamp ISO do Supabase (0 se ausente/inválido)"""
+    if not data_iso:
+        return 0.0
+    try:
+        data = datetime.fromisoformat(data_iso)
+    except ValueError:
+        return 0.0
+    if data.tzinfo is None:
+        data = data.replace(tzinfo=timezone.utc)
+    return max(0.0, (datetime.now(timezone.utc) - data).total_seconds() / 86400)
+
+def falhas_anteriores(produto: Dict) -> int:
+    """Tentativas anteriores sem resolver o produto (já consultado ou em ação manual)"""
+    return int(bool(produto.get('consultado_em'))) + int(produto.get('status') == 'acao_manual')
+
+# Critérios disponíveis: nome -> função(produto) -> valor.
+# Para um critério novo, basta registrar aqui e usar o nome em PRIORIDADE.
+CRITERIOS_PRIORIDADE = {
+    'ocorrencias': lambda p: p.get('quantidade_ocorrencias') or 1,  # Usuários que escanearam
+    'idade': lambda p: dias_desde(p.get('data_primeira_deteccao') or p.get('created_at')),
+    'falhas': falhas_anteriores,
+}
+
+# Colunas que cada critério precisa (só essas são buscadas no Supabase)
+COLUNAS_CRITERIOS = {
+    'ocorrencias': ['quantidade_ocorrencias'],
+    'idade': ['data_primeira_deteccao'],
+    'falhas': ['consultado_em', 'status'],
+}
+
+def carregar_pesos(texto: str) -> Dict[str, float]:
+    """Lê PRIORIDADE ("ocorrencias=1,idade=0.05,falhas=-2") em {critério: peso}"""
+    pesos = {}
+    for item in texto.split(','):
+        nome, _, peso = item.strip().partition('=')
+        if not nome:
+            continue
+        if nome not in CRITERIOS_PRIORIDADE:
+            log(f"Critério de prioridade desconhecido ignorado: {nome}", 'WARNING')
+            continue
+        try:
+            pesos[nome] = float(peso or 1)
+        except ValueError:
+            log(f"Peso inválido para '{nome}': {peso}", 'WARNING')
+    return pesos
+
+PESOS_PRIORIDADE = carregar_pesos(PRIORIDADE)
+
+def prioridade(produto: Dict) -> float:
+    """Pontuação do produto: soma ponderada dos critérios configurados"""
+    return sum(peso * CRITERIOS_PRIORIDADE[nome](produto) for nome, peso in PESOS_PRIORIDADE.items())
+
+def chave_grupo(produto: Dict):
+    """
+    Chave do grupo da linha: o GTIN canônico ("7891910000197" e
+    "07891910000197" caem no mesmo grupo). GTINs inválidos ficam sozinhos.
+    """
+    canonico = normalizar_gtin(produto.get('ean_gtin'))[0]
+    return canonico if canonico else ('invalido', produto['id'])
+
+def agrupar_por_gtin(produtos: List[Dict]) -> List[List[Dict]]:
+    """Agrupa as linhas pendentes pelo GTIN canônico, na ordem de chegada"""
+    grupos = {}
+    for produto in produtos:
+        grupos.setdefault(chave_grupo(produto), []).append(produto)
+    return list(grupos.values())
+
+def pontuar_pendentes(pendentes: Iterator[Dict]) -> Dict:
+    """
+    Primeira passada pelo backlog inteiro: pontuação de cada grupo (soma
+    das prioridades das linhas), sem guardar as linhas. A ordem do dicionário
+    é a de chegada do primeiro registro de cada grupo.
+    """
+    pontuacoes = {}
+    for produto in pendentes:
+        chave = chave_grupo(produto)
+        pontuacoes[chave] = pontuacoes.get(chave, 0.0) + prioridade(produto)
+    return pontuacoes
+
+def agendar_produtos(pontuacoes: Dict, creditos: int, pendentes: Iterator[Dict]) -> List[List[Dict]]:
+    """
+    Escolhe os grupos de maior pontuação que cabem nos créditos — um crédito
+    por grupo; GTINs inválidos não consultam a Cosmos, então entram sem gastar
+    crédito — e relê o backlog (segunda passada) guardando só as linhas deles.
+    Empates mantêm a ordem de chegada.
+    """
+    posicao = {chave: i for i, chave in enumerate(pontuacoes)}
+    ordem = lambda chave: (-pontuacoes[chave], posicao[chave])
+    
+    validas = (chave for chave in pontuacoes if not isinstance(chave, tuple))
+    escolhidas = heapq.nsmallest(max(0, creditos), validas, key=ordem)
+    escolhidas += [chave for chave in pontuacoes if isinstance(chave, tuple)]
+    
+    grupos = {chave: [] for chave in sorted(escolhidas, key=ordem)}
+    for produto in pendentes:
+        grupo = grupos.get(chave_grupo(produto))
+        if grupo is not None:
+            grupo.append(produto)
+    
+    # Linhas resolvidas entre as duas passadas não voltam
+    return [grupo for grupo in grupos.values() if grupo]
+
+def agendar_em_fluxo(pendentes: Iterator[Dict], creditos: int) -> Iterator[List[Dict]]:
+    """
+    Sem critérios de prioridade (PRIORIDADE vazio): segue a ordem de chegada
+    lendo o backlog aos poucos, com memória constante. GTINs repetidos são
+    agrupados dentro de cada página; a leitura para quando os créditos acabam.
+    """
+    consultas = 0
+    while consultas < creditos:
+        pagina = list(islice(pendentes, PAGINA_PENDENTES))
+        if not pagina:
+            return
+        
+        for grupo in agrupar_por_gtin(pagina):
+            if normalizar_gtin(grupo[0].get('ean_gtin'))[0] is not None:
+                if consultas >= creditos:
+                    return
+                consultas += 1
+            yield grupo
+
+# ==================== RELATÓRIO ====================
+
+def imprimir_etapas():
+    """Tabela de tempo por etapa no console, da etapa que mais consumiu para a que menos"""
+    etapas = sorted(cronometro.resumo().items(), key=lambda item: item[1]['total_ms'], reverse=True)
+    if not etapas:
+        return
+    
+    log("\n⏱️ Tempo por etapa (ms):")
+    log(f"  {'etapa':<26}{'chamadas':>9}{'total':>10}{'p50':>8}{'p95':>8}{'máx':>8}")
+    for etapa, e in etapas:
+        log(f"  {etapa:<26}{e['chamadas']:>9}{e['total_ms']:>10.0f}{e['p50_ms']:>8.0f}{e['p95_ms']:>8.0f}{e['max_ms']:>8.0f}")
+
+def salvar_relatorio(situacao: str, **dados):
+    """Grava o relatório JSON da execução (tempos por etapa + dados recebidos)"""
+    if not RELATORIO_JSON:
+        return
+    
+    relatorio = {
+        'gerado_em': datetime.now(timezone.utc).isoformat(),
+        'situacao': situacao,
+        'configuracao': {
+            'limite_produtos': LIMITE_PRODUTOS,
+            'concorrencia': CONCORRENCIA,
+            'tamanho_lote_consulta': TAMANHO_LOTE_CONSULTA,
+            'tamanho_lote_escrita': TAMANHO_LOTE_ESCRITA,
+            'tamanho_lote_log': TAMANHO_LOTE_LOG,
+            'pagina_pendentes': PAGINA_PENDENTES,
+            'prioridade': PRIORIDADE,
+            'modo_teste': MODO_TESTE
+        },
+        **dados,
+        'etapas': cronometro.resumo()
+    }
+    
+    try:
+        with open(RELATORIO_JSON, 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+        log(f"📄 Relatório salvo em {RELATORIO_JSON}", 'DEBUG')
+    except OSError as e:
+        log(f"⚠️ Não foi possível salvar o relatório: {e}", 'WARNING')
+
 # ==================== FUNÇÃO PRINCIPAL ====================
 
+def encerrar_gravacoes():
+    """
+    Grava o que restou no buffer, espera os logs em segundo plano e só
+    então compacta o journal. Pode ser chamada mais de uma vez.
+    """
+    gravados = buffer_atualizacoes.descarregar()
+    if gravados:
+        log(f"💾 {gravados} resultado(s) pendente(s) gravado(s)")
+    escritor_logs.encerrar(PRAZO_ENCERRAMENTO_LOGS)
+    diario_consultas.compactar()
+
 def main():
     """Função principal de processamento"""
     
@@ -285,87 +1062,157 @@ def main():
     if MODO_TESTE:
         log("⚠️ MODO DE TESTE ATIVADO - Nenhuma alteração será feita no banco", 'WARNING')
     
-    # Status inicial dos tokens
+    relatorio = {'situacao': 'erro'}
+    try:
+        # Resultados pagos numa execução interrompida vão para o banco primeiro
+        retomar_diario()
+        codigo_saida = processar_pendentes(relatorio)
+    except KeyboardInterrupt:
+        relatorio['situacao'] = 'interrompido'
+        raise
+    except Exception as e:
+        relatorio['erro'] = str(e)
+        raise
+    finally:
+        # Toda saída (retorno antecipado, erro, Ctrl+C) grava o que já foi
+        # consultado e pago, inclusive os logs, antes de compactar o journal
+        encerrar_gravacoes()
+        salvar_relatorio(**relatorio)
+    
+    sys.exit(codigo_saida)
+
+def processar_pendentes(relatorio: Dict) -> int:
+    """
+    Consulta e grava os pendentes escolhidos. Preenche `relatorio` (situação
+    e dados do relatório JSON) e retorna o código de saída do processo.
+    """
+    # Acordar a API Render (cold start) em paralelo com as leituras do Supabase
+    log("\n🌅 Acordando API Render enquanto busca dados no Supabase...")
+    cancelar_aquecimento = threading.Event()
+    pendentes = iterar_produtos_pendentes()
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futuro_aquecimento = executor.submit(aquecer_api_render, cancelar_aquecimento)
+        futuro_admin = executor.submit(obter_admin_id)
+        if PESOS_PRIORIDADE:
+            # Priorizar exige ver o backlog inteiro antes: só as pontuações
+            futuro_produtos = executor.submit(pontuar_pendentes, pendentes)
+        else:
+            # Em fluxo: só a primeira página agora, o resto sob demanda
+            futuro_produtos = executor.submit(lambda: list(islice(pendentes, 1)))
+        
+        admin_id = futuro_admin.result()
+        log(f"\n👤 Admin ID: {admin_id}")
+        
+        candidatos = futuro_produtos.result()
+        if not candidatos:
+            cancelar_aquecimento.set()
+            log("\n✅ Nenhum produto pendente para processar!", 'SUCCESS')
+            relatorio['situacao'] = 'sem_pendentes'
+            return 0
+        
+        # Só começa a processar quando a API estiver de pé
+        aquecimento = futuro_aquecimento.result()
+    
+    if not aquecimento['pronta']:
+        log(f"❌ API Render não respondeu após {aquecimento['tempo']:.1f}s - abortando", 'ERROR')
+        relatorio.update(situacao='api_indisponivel', aquecimento_s=round(aquecimento['tempo'], 3))
+        return 1
+    
+    log(f"🌅 API pronta em {aquecimento['tempo']:.1f}s ({aquecimento['tentativas']} tentativa(s))", 'SUCCESS')
+    
+    # Status inicial dos tokens (API já acordada, resposta rápida)
     log("\n📊 Status inicial dos tokens:")
     status_inicial = obter_status_tokens()
+    creditos = LIMITE_PRODUTOS
     if status_inicial:
         resumo = status_inicial.get('resumo', {})
         log(f"  Total usado: {resumo.get('total_usado', 0)}/100")
         log(f"  Disponível: {resumo.get('total_disponivel', 100)}")
+        creditos = min(LIMITE_PRODUTOS, resumo.get('total_disponivel', LIMITE_PRODUTOS))
+    else:
+        log(f"  Status indisponível - usando LIMITE_PRODUTOS ({LIMITE_PRODUTOS})", 'WARNING')
     
-    # Buscar admin ID
-    admin_id = obter_admin_id()
-    log(f"\n👤 Admin ID: {admin_id}")
-    
-    # Buscar produtos pendentes
-    produtos = buscar_produtos_pendentes(LIMITE_PRODUTOS)
-    
-    if not produtos:
-        log("\n✅ Nenhum produto pendente para processar!", 'SUCCESS')
-        return
+    # Escolher o que consultar com os créditos que restam hoje
+    if PESOS_PRIORIDADE:
+        grupos = agendar_produtos(candidatos, creditos, iterar_produtos_pendentes())
+        total_grupos = len(grupos)
+        log(f"\n🎯 {sum(len(g) for g in grupos)} pendentes escolhidos ({total_grupos} de "
+            f"{len(candidatos)} grupos do backlog) para {creditos} créditos (prioridade: {PRIORIDADE})")
+        if not grupos:
+            log("\n✅ Sem créditos disponíveis hoje - nada a processar", 'SUCCESS')
+            relatorio['situacao'] = 'sem_creditos'
+            return 0
+    else:
+        grupos = agendar_em_fluxo(chain(candidatos, pendentes), creditos)
+        total_grupos = '?'
+        log(f"\n🎯 Backlog em ordem de chegada, lido sob demanda, até {creditos} créditos")
     
     # Estatísticas
     estatisticas = {
-        'total': len(produtos),
+        'total': 0,
         'sucesso': 0,
         'nao_encontrado': 0,
         'erro': 0,
         'gtin_invalido': 0,
         'rate_limit': 0,
-        'tempo_total': 0
+        'tempo_total': 0,
+        'consultas': 0,
+        'creditos_economizados': 0
     }
     
-    log(f"\n🔄 Processando {estatisticas['total']} produtos...\n")
+    log(f"\n🔄 Processando {total_grupos} consultas em lotes de {TAMANHO_LOTE_CONSULTA} "
+        f"({CONCORRENCIA} lotes em paralelo)...\n")
     
     tempo_inicio_geral = time.time()
     
-    # Processar cada produto
-    for i, produto in enumerate(produtos, 1):
-        produto_id = produto['id']
-        gtin = produto['ean_gtin']
-        descricao = produto.get('descricao', 'Sem descrição')[:50]
-        
-        log(f"[{i}/{estatisticas['total']}] Processando: {gtin} - {descricao}")
-        
-        # Consultar API
-        resultado = consultar_api_render(gtin)
-        
-        if not resultado:
-            estatisticas['erro'] += 1
-            continue
-        
-        # Verificar GTIN inválido
-        if resultado.get('erro') == 'GTIN_INVALIDO':
-            estatisticas['gtin_invalido'] += 1
-            # Ainda atualiza o produto para 'consultado' com erro
-            atualizar_produto_supabase(produto_id, resultado['dados'], 0)
-            continue
+    def contabilizar(futuro) -> bool:
+        """Soma os resultados de um lote nas estatísticas; retorna False se deve parar"""
+        limite_atingido = False
+        for resultado in futuro.result():
+            estatisticas[resultado['situacao']] += resultado['linhas']
+            
+            # Consultas que a Cosmos cobrou uma vez para o grupo inteiro
+            if resultado['situacao'] in ('sucesso', 'nao_encontrado'):
+                estatisticas['consultas'] += 1
+                estatisticas['tempo_total'] += resultado['tempo_resposta']
+                estatisticas['creditos_economizados'] += resultado['linhas'] - 1
+            
+            limite_atingido = limite_atingido or resultado['situacao'] == 'rate_limit'
         
-        # Verificar rate limit
-        if resultado.get('erro') == 'RATE_LIMIT':
-            estatisticas['rate_limit'] += 1
+        if limite_atingido:
             log("  🚫 Limite diário atingido - Interrompendo processamento", 'WARNING')
-            break
-        
-        # Processar resultado
-        dados_api = resultado.get('dados', {})
-        tempo_resposta = resultado.get('tempo_resposta', 0)
-        encontrado = dados_api.get('encontrado', False)
-        
-        if encontrado:
-            estatisticas['sucesso'] += 1
-        else:
-            estatisticas['nao_encontrado'] += 1
-        
-        # Atualizar no Supabase
-        if atualizar_produto_supabase(produto_id, dados_api, tempo_resposta):
-            # Registrar log
-            registrar_log_consulta(admin_id, produto_id, gtin, encontrado, tempo_resposta, dados_api)
+            return False
+        return True
+    
+    # Processar lotes de TAMANHO_LOTE_CONSULTA grupos (uma requisição cada),
+    # com até CONCORRENCIA em andamento ao mesmo tempo. Novos lotes só são
+    # enviados quando um termina, então um RATE_LIMIT interrompe o envio
+    # imediatamente (os que já estão em andamento terminam).
+    continuar = True
+    grupos = iter(grupos)
+    lotes = iter(lambda: list(islice(grupos, TAMANHO_LOTE_CONSULTA)), [])
+    with ThreadPoolExecutor(max_workers=CONCORRENCIA) as executor:
+        em_andamento = set()
+        proximo = 1
         
-        estatisticas['tempo_total'] += tempo_resposta
+        for lote in lotes:
+            if len(em_andamento) >= CONCORRENCIA:
+                concluidos, em_andamento = wait(em_andamento, return_when=FIRST_COMPLETED)
+                for futuro in concluidos:
+                    continuar = contabilizar(futuro) and continuar
+            
+            if not continuar:
+                break
+            
+            estatisticas['total'] += sum(len(grupo) for grupo in lote)
+            em_andamento.add(executor.submit(processar_lote, proximo, total_grupos, lote, admin_id))
+            proximo += len(lote)
         
-        # Delay entre requisições (evitar sobrecarga)
-        time.sleep(0.5)
+        for futuro in as_completed(em_andamento):
+            contabilizar(futuro)
+    
+    # Gravar o que restou no buffer e esperar os logs em segundo plano
+    encerrar_gravacoes()
     
     tempo_total_geral = time.time() - tempo_inicio_geral
     
@@ -378,12 +1225,15 @@ def main():
     log(f"⚠️ GTINs inválidos: {estatisticas['gtin_invalido']}")
     log(f"⚠️ Erros de rede/API: {estatisticas['erro']}")
     log(f"🚫 Rate limit: {estatisticas['rate_limit']}")
+    log(f"🔗 Créditos economizados (GTINs repetidos): {estatisticas['creditos_economizados']}")
     log(f"⏱️ Tempo total: {tempo_total_geral:.2f}s")
+    log(f"🌅 Wake-up da API Render: {aquecimento['tempo']:.2f}s")
+    
+    # Tempo médio apenas das consultas que chegaram à Cosmos
+    if estatisticas['consultas'] > 0:
+        log(f"⚡ Tempo médio por consulta: {estatisticas['tempo_total'] / estatisticas['consultas']:.0f}ms")
     
-    # Calcula tempo médio apenas dos produtos que foram processados
-    processados = estatisticas['sucesso'] + estatisticas['nao_encontrado']
-    if processados > 0:
-        log(f"⚡ Tempo médio por produto: {estatisticas['tempo_total'] / processados:.0f}ms")
+    imprimir_etapas()
     
     # Status final dos tokens
     log("\n📊 Status final dos tokens:")
@@ -393,14 +1243,19 @@ def main():
         log(f"  Total usado: {resumo.get('total_usado', 0)}/100")
         log(f"  Disponível: {resumo.get('total_disponivel', 100)}")
     
+    relatorio.update(
+        situacao='concluido',
+        duracao_s=round(tempo_total_geral, 3),
+        aquecimento_s=round(aquecimento['tempo'], 3),
+        estatisticas=estatisticas,
+        tokens_final=status_final.get('resumo') if status_final else None
+    )
+    
     log("\n✅ PROCESSAMENTO CONCLUÍDO!", 'SUCCESS')
     log("=" * 60)
     
-    # Exit code baseado no sucesso
-    if estatisticas['erro'] > estatisticas['sucesso']:
-        sys.exit(1)  # Mais erros que sucessos = falha
-    else:
-        sys.exit(0)  # Sucesso
+    # Exit code baseado no sucesso: mais erros que sucessos = falha
+    return 1 if estatisticas['erro'] > estatisticas['sucesso'] else 0
 
 # ==================== EXECUÇÃO ====================
 
@@ -408,6 +1263,7 @@ if __name__ == '__main__':
     try:
         main()
     except KeyboardInterrupt:
+        # Resultados já consultados (e pagos) foram gravados pelo main()
         log("\n⚠️ Processamento interrompido pelo usuário", 'WARNING')
         sys.exit(130)
     except Exception as e:
@@ -0,0 +1,383 @@
+"""
+Servidores falsos para medir o processamento automático sem Supabase,
+Render ou Cosmos de verdade (usados pelo benchmark.py).
+
+- PostgRESTFalso: produtos_em_analise, log_consultas_api e profiles em memória
+- RenderFalso: /health, /ready, /api/status/tokens, /api/produtos/<gtin> e
+  /api/produtos/lote com créditos por token, cache, latência, cold start, aquecimento e
+  taxas de 404/429
+- CosmosFalso: /gtins/<gtin>.json, para subir a render-api de verdade
+
+Só biblioteca padrão. Latências e sorteios são reprodutíveis (seed) e um
+GTIN sempre recebe a mesma resposta (encontrado ou 404) em toda execução.
+"""
+
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Validação de GTIN compartilhada com a API (render-api/validacao_gtin.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'render-api'))
+from validacao_gtin import gtin_para_consulta, normalizar_gtin
+
+
+class _Manipulador(BaseHTTPRequestHandler):
+    """Repassa cada requisição para o servidor falso dono do socket"""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, como os servidores reais
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.dono.tratar(self, 'GET')
+
+    def do_POST(self):
+        self.server.dono.tratar(self, 'POST')
+
+    def do_PATCH(self):
+        self.server.dono.tratar(self, 'PATCH')
+
+    def ler_json(self):
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(tamanho) or b'null')
+
+    def responder(self, status, corpo=None):
+        conteudo = json.dumps(corpo).encode() if corpo is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(conteudo)))
+        self.end_headers()
+        self.wfile.write(conteudo)
+
+
+class _ServidorFalso:
+    """Base: servidor HTTP em thread própria numa porta livre de 127.0.0.1"""
+
+    def __init__(self, latencia=0.0, variacao=0.0, seed=42):
+        self.latencia = latencia
+        self.variacao = variacao
+        self.seed = seed
+        self._aleatorio = random.Random(seed)
+        self._lock = threading.Lock()
+        self._servidor = None
+        self.pedidos = {}
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._servidor.server_address[1]}"
+
+    def iniciar(self):
+        self._servidor = ThreadingHTTPServer(('127.0.0.1', 0), _Manipulador)
+        self._servidor.daemon_threads = True
+        self._servidor.dono = self
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self
+
+    def parar(self):
+        if self._servidor:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+
+    def esperar(self, latencia=None):
+        """Dorme a latência configurada, com variação de ±variacao (fração)"""
+        base = self.latencia if latencia is None else latencia
+        if base <= 0:
+            return
+        with self._lock:
+            fator = 1 + self._aleatorio.uniform(-self.variacao, self.variacao)
+        time.sleep(base * fator)
+
+    def sortear(self, taxa):
+        """True com probabilidade `taxa` (sorteio reprodutível)"""
+        with self._lock:
+            return self._aleatorio.random() < taxa
+
+    def resposta_fixa(self, gtin, taxa_404):
+        """Mesmo GTIN sempre encontrado ou sempre 404, independente da ordem"""
+        return random.Random(f"{self.seed}-{gtin}").random() < taxa_404
+
+    def contar(self, rota):
+        with self._lock:
+            self.pedidos[rota] = self.pedidos.get(rota, 0) + 1
+
+    def tratar(self, manipulador, metodo):
+        raise NotImplementedError
+
+
+class PostgRESTFalso(_ServidorFalso):
+    """Subconjunto do PostgREST usado pelo processar.py, com tabelas em memória"""
+
+    ADMIN_ID = '00000000-0000-4000-8000-000000000001'
+
+    def __init__(self, latencia_leitura=0.02, latencia_escrita=0.03, variacao=0.2, seed=42):
+        super().__init__(latencia_leitura, variacao, seed)
+        self.latencia_escrita = latencia_escrita
+        self.produtos = {}
+        self.logs = {}
+
+    def semear(self, produtos):
+        """Carrega linhas de produtos_em_analise"""
+        for produto in produtos:
+            self.produtos[produto['id']] = dict(produto)
+
+    def tratar(self, manipulador, metodo):
+        partes = urlsplit(manipulador.path)
+        tabela = partes.path.rsplit('/', 1)[-1]
+        params = {k: v[0] for k, v in parse_qs(partes.query).items()}
+        self.contar(f"{metodo} {tabela}")
+
+        if metodo == 'GET':
+            self.esperar()
+            if tabela == 'profiles':
+                return manipulador.responder(200, [{'id': self.ADMIN_ID}])
+            if tabela == 'produtos_em_analise':
+                return manipulador.responder(200, self._selecionar(params))
+
+        if metodo in ('POST', 'PATCH'):
+            corpo = manipulador.ler_json()
+            self.esperar(self.latencia_escrita)
+
+            if tabela == 'produtos_em_analise' and metodo == 'PATCH':
+                with self._lock:
+                    alteradas = self._filtrar(list(self.produtos.values()), params)
+                    for linha in alteradas:
+                        linha.update(corpo)
+                    alteradas = [dict(linha) for linha in alteradas]
+                if 'return=representation' in manipulador.headers.get('Prefer', ''):
+                    return manipulador.responder(200, self._colunas(alteradas, params))
+                return manipulador.responder(204)
+
+            if tabela == 'log_consultas_api':
+                return self._inserir_logs(manipulador, corpo, params)
+
+        manipulador.responder(404, {'message': f'{metodo} {tabela} não suportado'})
+
+    @staticmethod
+    def _filtrar(linhas, params):
+        """Filtros eq./in.(...) nas colunas id e status"""
+        for coluna in ('id', 'status'):
+            filtro = params.get(coluna, '')
+            if filtro.startswith('eq.'):
+                linhas = [l for l in linhas if str(l.get(coluna)) == filtro[3:]]
+            elif filtro.startswith('in.('):
+                permitidos = filtro[4:-1].split(',')
+                linhas = [l for l in linhas if str(l.get(coluna)) in permitidos]
+        return linhas
+
+    @staticmethod
+    def _colunas(linhas, params):
+        """Aplica o select=... (todas as colunas se ausente)"""
+        colunas = params.get('select', '*')
+        if colunas == '*':
+            return linhas
+        return [{c: l.get(c) for c in colunas.split(',')} for l in linhas]
+
+    def _selecionar(self, params):
+        """GET com filtros, paginação por chave (or=...), order, limit e select"""
+        linhas = self._filtrar(list(self.produtos.values()), params)
+
+        linhas.sort(key=lambda l: (l.get('created_at') or '', l['id']))
+
+        chave = re.match(
+            r'\(created_at\.gt\."([^"]+)",and\(created_at\.eq\."[^"]+",id\.gt\.([^)]+)\)\)',
+            params.get('or', '')
+        )
+        if chave:
+            data, ultimo_id = chave.groups()
+            linhas = [
+                l for l in linhas
+                if l['created_at'] > data or (l['created_at'] == data and l['id'] > ultimo_id)
+            ]
+
+        linhas = linhas[:int(params.get('limit', len(linhas)))]
+        return self._colunas(linhas, params)
+
+    def _inserir_logs(self, manipulador, corpo, params):
+        """Insert em log_consultas_api; duplicata (on_conflict) é ignorada ou vira 409"""
+        coluna = params.get('on_conflict', 'produto_id')
+        ignorar = 'ignore-duplicates' in manipulador.headers.get('Prefer', '')
+
+        with self._lock:
+            for linha in corpo if isinstance(corpo, list) else [corpo]:
+                if linha.get(coluna) in self.logs:
+                    if not ignorar:
+                        return manipulador.responder(409, {'message': 'duplicate key'})
+                    continue
+                self.logs[linha.get(coluna)] = linha
+        manipulador.responder(201)
+
+    def gravados(self):
+        """Quantos produtos saíram da fila (status 'consultado')"""
+        with self._lock:
+            return sum(1 for l in self.produtos.values() if l.get('status') == 'consultado')
+
+
+class RenderFalso(_ServidorFalso):
+    """
+    Imita a render-api: cache positivo/negativo, rotação de tokens com
+    limite diário, 404 (cobra crédito), 429 de um token (pula para o
+    próximo), cold start (requisições ficam presas até a instância subir) e
+    aquecimento (depois de subir, /ready responde 503 por mais alguns segundos).
+    """
+
+    def __init__(self, latencia=0.3, variacao=0.3, taxa_404=0.2, taxa_429=0.0,
+                 cold_start=0.0, aquecimento=0.0, tokens=4, limite_token=25, seed=42):
+        super().__init__(latencia, variacao, seed)
+        self.taxa_404 = taxa_404
+        self.taxa_429 = taxa_429
+        self.cold_start = cold_start
+        self.aquecimento = aquecimento
+        self.limite_token = limite_token
+        self.uso_tokens = [0] * tokens
+        self.cache = {}
+        self.creditos_gastos = 0
+        self.acertos_cache = 0
+        self._pronto_em = None
+
+    def iniciar(self):
+        self._pronto_em = time.time() + self.cold_start
+        return super().iniciar()
+
+    def _status_tokens(self):
+        with self._lock:
+            usado = sum(self.uso_tokens)
+            limite = self.limite_token * len(self.uso_tokens)
+        return {'resumo': {
+            'total_tokens': len(self.uso_tokens),
+            'total_usado': usado,
+            'total_disponivel': limite - usado,
+            'limite_total': limite
+        }}
+
+    def tratar(self, manipulador, metodo):
+        # Cold start: o proxy do Render segura a requisição até a instância subir
+        restante = self._pronto_em - time.time()
+        if restante > 0:
+            time.sleep(restante)
+
+        caminho = urlsplit(manipulador.path).path
+        if caminho.startswith('/api/produtos/') and caminho != '/api/produtos/lote':
+            self.contar('/api/produtos')
+        else:
+            self.contar(caminho)
+
+        if caminho == '/health':
+            return manipulador.responder(200, {'status': 'healthy'})
+        if caminho == '/ready':
+            pronto = time.time() >= self._pronto_em + self.aquecimento
+            return manipulador.responder(200 if pronto else 503, {'pronto': pronto})
+        if caminho == '/api/status/tokens':
+            return manipulador.responder(200, self._status_tokens())
+        if caminho == '/api/produtos/lote' and metodo == 'POST':
+            if not manipulador.headers.get('Authorization', '').startswith('Bearer '):
+                return manipulador.responder(401, {'erro': 'Token de autorização não fornecido'})
+            return manipulador.responder(200, self._consultar_lote(manipulador.ler_json()['gtins']))
+        if caminho.startswith('/api/produtos/'):
+            if not manipulador.headers.get('Authorization', '').startswith('Bearer '):
+                return manipulador.responder(401, {'erro': 'Token de autorização não fornecido'})
+            return manipulador.responder(*self._consultar(caminho.rsplit('/', 1)[-1]))
+
+        manipulador.responder(404, {'erro': 'Endpoint não encontrado'})
+
+    def _consultar_lote(self, gtins):
+        """Como a API: sem repetir GTIN canônico, até 4 consultas simultâneas"""
+        unicos = {}
+        for gtin in gtins:
+            unicos.setdefault(normalizar_gtin(gtin)[0] or gtin, gtin)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            respostas = list(executor.map(self._consultar, unicos.values()))
+        return {
+            'total': len(unicos),
+            'duplicados_ignorados': len(gtins) - len(unicos),
+            'resultados': [
+                {'ean_gtin': gtin, 'status': status, 'resposta': resposta}
+                for gtin, (status, resposta) in zip(unicos.values(), respostas)
+            ]
+        }
+
+    def _consultar(self, gtin):
+        canonico, mensagem = normalizar_gtin(gtin)
+        if not canonico:
+            return 400, {'erro': 'GTIN inválido', 'mensagem': mensagem, 'ean_gtin': gtin}
+
+        with self._lock:
+            if canonico in self.cache:
+                self.acertos_cache += 1
+                return 200, dict(self.cache[canonico], origem='cache')
+
+        self.esperar()
+
+        with self._lock:
+            for i, usado in enumerate(self.uso_tokens):
+                if usado >= self.limite_token:
+                    continue
+                if self._aleatorio.random() < self.taxa_429:
+                    # Cosmos recusou este token: esgotado até amanhã
+                    self.uso_tokens[i] = self.limite_token
+                    continue
+
+                self.uso_tokens[i] += 1
+                self.creditos_gastos += 1
+                codigo = gtin_para_consulta(canonico)
+                if self.resposta_fixa(canonico, self.taxa_404):
+                    resposta = {'encontrado': False, 'ean_gtin': codigo,
+                                'mensagem': 'Produto não encontrado na base Cosmos'}
+                else:
+                    resposta = {'encontrado': True, 'ean_gtin': codigo,
+                                'descricao': f'Produto {codigo}', 'marca': 'Marca Falsa',
+                                'mensagem': 'Produto encontrado com sucesso'}
+                self.cache[canonico] = resposta
+                return 200, dict(resposta, origem='cosmos')
+
+        return 429, {'erro': 'Limite de consultas atingido', 'mensagem': 'Todos os tokens esgotados'}
+
+
+class CosmosFalso(_ServidorFalso):
+    """Imita GET /gtins/<gtin>.json da Cosmos Bluesoft, com limite diário por token"""
+
+    def __init__(self, latencia=0.3, variacao=0.3, taxa_404=0.2, taxa_429=0.0,
+                 limite_token=25, seed=42):
+        super().__init__(latencia, variacao, seed)
+        self.taxa_404 = taxa_404
+        self.taxa_429 = taxa_429
+        self.limite_token = limite_token
+        self.uso_tokens = {}
+        self.creditos_gastos = 0
+
+    def tratar(self, manipulador, metodo):
+        caminho = urlsplit(manipulador.path).path
+        rota = re.match(r'^/gtins/(\d+)\.json$', caminho)
+        self.contar('/gtins' if rota else caminho)
+        if metodo != 'GET' or not rota:
+            return manipulador.responder(404, {'message': 'Not found'})
+
+        token = manipulador.headers.get('X-Cosmos-Token', '')
+        self.esperar()
+
+        with self._lock:
+            if self.uso_tokens.get(token, 0) >= self.limite_token or self._aleatorio.random() < self.taxa_429:
+                return manipulador.responder(429, {'message': 'Too many requests'})
+            self.uso_tokens[token] = self.uso_tokens.get(token, 0) + 1
+            self.creditos_gastos += 1
+
+        gtin = rota.group(1)
+        if self.resposta_fixa(gtin.zfill(14), self.taxa_404):
+            return manipulador.responder(404, {'message': 'GTIN not found'})
+
+        manipulador.responder(200, {
+            'gtin': int(gtin),
+            'description': f'Produto {gtin}',
+            'brand': {'name': 'Marca Falsa'},
+            'ncm': {'code': '2202.10.00', 'description': 'Bebidas'},
+            'avg_price': 4.99,
+            'net_weight': 350,
+            'thumbnail': f'https://cdn-cosmos.bluesoft.com.br/products/{gtin}'
+        })